@@ -0,0 +1,301 @@
+"""
+Нагрузочный тест телеграм-бота без сети.
+
+Вместо Telegram используются заглушки FakeBot (context.bot) и
+fake_update: бот получает те же вызовы wake_up, init_calculation и
+message_handler, что и от диспетчера. Каждый из chats чатов проходит
+rounds диалогов: /start, /calculate, две карты (с переключением
+клавиатуры '>>' для старших карт), количество игроков, стадия игры и
+карты стола; карты и параметры выбираются случайно, но воспроизводимо
+(seed); с --eq каждый диалог - одна команда /eq с теми же параметрами.
+Чаты распределяются между threads потоками, каждый из которых
+обрабатывает сообщения своих чатов по очереди - как диспетчер, через
+который одновременно идут диалоги многих пользователей. Следующий
+диалог чат начинает, только получив ответ на предыдущий.
+
+Результат: задержка обработчиков (p50/p95/p99), количество сообщений в
+секунду, время от последнего сообщения диалога до ответа с результатом
+и прирост памяти процесса (RSS).
+
+Запуск: python bot_benchmark.py [--chats 200] [--rounds 3] [--threads 1]
+    [--executor process|thread] [--state memory|sqlite] [--eq]
+"""
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+import types
+import typing
+
+from cards import SUIT, VALUE_R
+from state import MemoryStateStore, SqliteStateStore
+from telegram_poker_bot import PokerBot
+
+
+FAKE_TOKEN = '123456:benchmark'
+
+CARD_TEXT = {value: text for text, value in VALUE_R.items()}
+
+# Старшие карты (10-A) выбираются на второй странице клавиатуры.
+HIGH_VALUE = VALUE_R['10']
+
+# Обработчики, с которых начинается диалог.
+DIALOG_STARTS = ('wake_up', 'eq')
+
+# Начала ответов, завершающих диалог; первый - результат расчета.
+FINAL_TEXTS = ('Игроков', 'Не удалось', 'Расчет отменен', 'Сервер перегружен')
+
+
+class FakeBot:
+    """
+    Заглушка telegram.Bot: запоминает время ответов, завершающих диалог
+    (результат, ошибка, отмена или отказ из-за перегрузки).
+    """
+
+    def __init__(self) -> None:
+        self.sent = 0
+        self.edited = 0
+        self.answered = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        with self._lock:
+            self.sent += 1
+            self._answer(chat_id, text)
+            return types.SimpleNamespace(
+                message_id=next(self._ids), chat_id=chat_id, text=text
+            )
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        with self._lock:
+            self.edited += 1
+            self._answer(chat_id, text)
+            return True
+
+    def _answer(self, chat_id, text):
+        if text.startswith(FINAL_TEXTS):
+            self.answered.setdefault(chat_id, []).append(
+                (time.perf_counter(), text.startswith('Игроков'))
+            )
+
+
+def fake_update(chat_id: int, text: str) -> types.SimpleNamespace:
+    """
+    Заглушка telegram.Update с полями, которые использует бот.
+    """
+    chat = types.SimpleNamespace(id=chat_id, first_name='Bench', last_name=str(chat_id))
+    return types.SimpleNamespace(
+        message=types.SimpleNamespace(chat_id=chat_id, text=text, chat=chat)
+    )
+
+
+def card_messages(card: typing.Tuple[int, int]) -> typing.List[str]:
+    text = CARD_TEXT[card[0]] + SUIT[card[1]]
+    return ['>>', text] if card[0] >= HIGH_VALUE else [text]
+
+
+def session(
+    rng: random.Random, one_shot: bool = False
+) -> typing.List[typing.Tuple[str, str]]:
+    """
+    Сообщения одного диалога: пары (<обработчик>, <текст>).
+    :param one_shot: вместо пошагового диалога - одна команда /eq с теми
+        же параметрами.
+    """
+    stage = rng.randrange(4)
+    cards = rng.sample(
+        [(value, suit) for value in range(13) for suit in range(4)],
+        2 + (stage + 2 if stage else 0)
+    )
+    if one_shot:
+        texts = [CARD_TEXT[value] + SUIT[suit] for value, suit in cards]
+        command = f'/eq {"".join(texts[:2])} {rng.randint(2, 8)} {"".join(texts[2:])}'
+        return [('eq', command.strip())]
+    messages = [('wake_up', '/start'), ('init_calculation', '/calculate')]
+    for card in cards[:2]:
+        messages += [('message_handler', text) for text in card_messages(card)]
+    messages += [
+        ('message_handler', str(rng.randint(2, 8))),
+        ('message_handler', str(stage)),
+    ]
+    for card in cards[2:]:
+        messages += [('message_handler', text) for text in card_messages(card)]
+    return messages
+
+
+def rss() -> int:
+    """
+    Текущий размер резидентной памяти процесса в байтах.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # ru_maxrss - пиковое значение, в килобайтах на Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values: typing.Sequence[float], q: float) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+
+def run(
+    bot: PokerBot,
+    chats: int,
+    rounds: int = 1,
+    threads: int = 1,
+    seed: int = 0,
+    one_shot: bool = False,
+    timeout: float = 600
+) -> dict:
+    """
+    Прогоняет диалоги chats чатов через обработчики бота.
+    :param bot: бот, у которого context.bot заменен на FakeBot.
+    :param rounds: количество диалогов каждого чата.
+    :param threads: количество потоков, обрабатывающих сообщения.
+    :param one_shot: диалоги - команды /eq (см. session).
+    :param timeout: сколько секунд ждать результатов расчетов.
+    :return: статистика (см. report).
+    """
+    fake_bot = FakeBot()
+    context = types.SimpleNamespace(bot=fake_bot)
+    rng = random.Random(seed)
+    scripts = {
+        chat_id: [
+            message for _ in range(rounds) for message in session(rng, one_shot)
+        ]
+        for chat_id in range(1, chats + 1)
+    }
+    latencies = [[] for _ in range(threads)]
+    # время последнего сообщения каждого диалога
+    finished = collections.defaultdict(list)
+
+    def waiting(chat_id):
+        return len(fake_bot.answered.get(chat_id, ())) < len(finished[chat_id])
+
+    def worker(number):
+        own = [chat_id for chat_id in scripts if chat_id % threads == number]
+        positions = dict.fromkeys(own, 0)
+        while positions:
+            ready = [chat_id for chat_id in positions if not waiting(chat_id)]
+            if not ready:
+                time.sleep(0.001)
+            for chat_id in ready:
+                if waiting(chat_id):
+                    continue
+                script = scripts[chat_id]
+                handler, text = script[positions[chat_id]]
+                started = time.perf_counter()
+                getattr(bot, handler)(fake_update(chat_id, text), context)
+                ended = time.perf_counter()
+                latencies[number].append(ended - started)
+                positions[chat_id] += 1
+                if positions[chat_id] == len(script) or (
+                    script[positions[chat_id]][0] in DIALOG_STARTS
+                ):
+                    finished[chat_id].append(ended)
+                if positions[chat_id] == len(script):
+                    del positions[chat_id]
+
+    memory_before = rss()
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        list(executor.map(worker, range(threads)))
+    elapsed = time.perf_counter() - started
+    expected = chats * rounds
+    deadline = time.monotonic() + timeout
+    while sum(map(len, fake_bot.answered.values())) < expected and (
+        time.monotonic() < deadline
+    ):
+        time.sleep(0.01)
+    total = time.perf_counter() - started
+    memory_after = rss()
+
+    # у каждого диалога ровно один завершающий ответ, и приходят они в
+    # порядке диалогов
+    answer_latencies = [
+        answered - asked
+        for chat_id, answers in fake_bot.answered.items()
+        for asked, (answered, result) in zip(finished[chat_id], answers)
+        if result
+    ]
+    latencies = [latency for part in latencies for latency in part]
+    return {
+        'chats': chats,
+        'dialogs': expected,
+        'answered': len(answer_latencies),
+        'messages': len(latencies),
+        'elapsed': elapsed,
+        'total': total,
+        'messages_per_second': len(latencies) / elapsed,
+        'handler_p50': percentile(latencies, 50),
+        'handler_p95': percentile(latencies, 95),
+        'handler_p99': percentile(latencies, 99),
+        'handler_max': max(latencies),
+        'answer_p50': percentile(answer_latencies, 50),
+        'answer_p95': percentile(answer_latencies, 95),
+        'answer_p99': percentile(answer_latencies, 99),
+        'api_calls': fake_bot.sent + fake_bot.edited,
+        'memory_growth': memory_after - memory_before,
+    }
+
+
+def report(stats: dict) -> str:
+    ms = 1000
+    return '\n'.join([
+        f'Chats: {stats["chats"]}, dialogs: {stats["dialogs"]}, '
+        f'answered: {stats["answered"]}',
+        f'Messages: {stats["messages"]} in {stats["elapsed"]:.2f}s '
+        f'({stats["messages_per_second"]:.0f}/s), all answers in '
+        f'{stats["total"]:.2f}s',
+        f'Handler latency, ms: p50 {stats["handler_p50"] * ms:.3f}, '
+        f'p95 {stats["handler_p95"] * ms:.3f}, p99 {stats["handler_p99"] * ms:.3f}, '
+        f'max {stats["handler_max"] * ms:.3f}',
+        f'Answer latency, ms: p50 {stats["answer_p50"] * ms:.1f}, '
+        f'p95 {stats["answer_p95"] * ms:.1f}, p99 {stats["answer_p99"] * ms:.1f}',
+        f'API calls: {stats["api_calls"]} '
+        f'({stats["api_calls"] / max(stats["answered"], 1):.1f} per answer)',
+        f'Memory growth: {stats["memory_growth"] / 2 ** 20:.1f} MB',
+    ])
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бота.')
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--eq', action='store_true', help='диалоги - команды /eq')
+    parser.add_argument('--executor', choices=('process', 'thread'), default='process')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--state', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--state-path', default='benchmark_state.sqlite3')
+    args = parser.parse_args()
+    if args.executor == 'process':
+        executor = concurrent.futures.ProcessPoolExecutor(args.workers)
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(args.workers)
+    if args.state == 'sqlite':
+        state = SqliteStateStore(args.state_path)
+    else:
+        state = MemoryStateStore()
+    poker_bot = PokerBot(FAKE_TOKEN, executor, state)
+    try:
+        print(report(run(
+            poker_bot, args.chats, args.rounds, args.threads, args.seed, args.eq
+        )))
+    finally:
+        executor.shutdown(cancel_futures=True)
+        state.close()
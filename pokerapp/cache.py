@@ -0,0 +1,85 @@
+"""
+Ограниченный по размеру кэш результатов расчета вероятности выигрыша.
+
+Ключ - каноническая форма ситуации (см. модуль canonical), количество
+игроков и параметры точности расчета. Записи вытесняются по принципу LRU
+при превышении maxsize и по истечении ttl секунд.
+"""
+import collections
+import threading
+import time
+import typing
+
+from canonical import canonical_key
+from config import EQUITY_CACHE_SIZE, EQUITY_CACHE_TTL
+
+
+class EquityCache:
+    def __init__(self, maxsize: int = 100000, ttl: float | None = None) -> None:
+        """
+        :param maxsize: максимальное количество записей.
+        :param ttl: время жизни записи в секундах (None - без ограничения).
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(
+        hand: typing.Sequence[typing.Tuple[int, int]],
+        players_count: int,
+        table: typing.Sequence[typing.Tuple[int, int]] | None = None,
+        precision: typing.Hashable = None
+    ) -> tuple:
+        """
+        Ключ записи: одинаков для ситуаций, отличающихся только
+        обозначением мастей.
+        """
+        return canonical_key(hand, table or ()), players_count, precision
+
+    def get(self, key: typing.Hashable) -> typing.Any:
+        """
+        :return: сохраненное значение, либо None.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (
+                self.ttl is None or time.monotonic() - entry[1] < self.ttl
+            ):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: typing.Hashable, value: typing.Any) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+equity_cache = EquityCache(EQUITY_CACHE_SIZE, EQUITY_CACHE_TTL)
@@ -0,0 +1,67 @@
+"""
+Приведение ситуации к каноническому виду с точностью до перестановки
+мастей.
+
+Ситуации, отличающиеся только обозначением мастей (например, A♤K♤ и
+A♥K♥ на соответственно перекрашенных столах), имеют одинаковую
+вероятность выигрыша. Каноническая форма одинакова для всех таких
+ситуаций, поэтому ее (или ее ключ) используют таблицы, кэши и переборы.
+
+Масти упорядочиваются по сигнатуре - номиналам карт этой масти в руке, на
+столе и среди известных сброшенных карт; масть с наибольшей сигнатурой
+получает номер 0 и т.д. Масти с одинаковыми сигнатурами взаимозаменяемы,
+поэтому результат от их порядка не зависит.
+"""
+import typing
+
+
+Cards = typing.Sequence[typing.Tuple[int, int]]
+CanonicalForm = typing.Tuple[typing.Tuple[typing.Tuple[int, int], ...], ...]
+
+
+def suit_mapping(*groups: Cards) -> typing.List[int]:
+    """
+    Перестановка мастей, приводящая группы карт к каноническому виду.
+    :return: список, где на месте старой масти стоит ее новый номер.
+    """
+    signatures = [[[] for _ in groups] for _ in range(4)]
+    for group_index, group in enumerate(groups):
+        for value, suit in group:
+            signatures[suit][group_index].append(value)
+    for signature in signatures:
+        for values in signature:
+            values.sort(reverse=True)
+    order = sorted(range(4), key=lambda suit: signatures[suit], reverse=True)
+    mapping = [0] * 4
+    for new_suit, suit in enumerate(order):
+        mapping[suit] = new_suit
+    return mapping
+
+
+def canonicalize(
+    hand: Cards, board: Cards = (), dead: Cards = ()
+) -> CanonicalForm:
+    """
+    Каноническая форма ситуации: рука, стол и известные сброшенные карты с
+    переставленными мастями, каждая группа упорядочена по убыванию
+    номинала, а при равных номиналах - по возрастанию масти.
+    """
+    mapping = suit_mapping(hand, board, dead)
+    return tuple(
+        tuple(sorted(
+            ((value, mapping[suit]) for value, suit in group),
+            key=lambda card: (-card[0], card[1])
+        ))
+        for group in (hand, board, dead)
+    )
+
+
+def canonical_key(hand: Cards, board: Cards = (), dead: Cards = ()) -> str:
+    """
+    Строковый ключ канонической формы, например 'm0l0|f0e1a2|'
+    (номинал - буква от 'a' для двойки до 'm' для туза, затем масть).
+    """
+    return '|'.join(
+        ''.join(chr(ord('a') + value) + str(suit) for value, suit in group)
+        for group in canonicalize(hand, board, dead)
+    )
@@ -1,5 +1,17 @@
 import random
-from typing import Dict, List, Sequence, Tuple
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+from cache import equity_cache
+from canonical import canonical_key, canonicalize
+from cardset import as_card_set, CardSet
+from census import census, HANDS_COUNT as CENSUS_HANDS_COUNT
+from equity import calculate, estimate
+from evaluator import CATEGORY_SHIFT, decode, evaluate_batch, evaluate_cards
+from preflop import (
+    get_table, HANDS_COUNT, MAX_PLAYERS, MIN_PLAYERS, representative
+)
 
 
 SUIT = {0: '\u2664', 1: '\u2665', 2: '\u2666', 3: '\u2667'}
@@ -14,6 +26,9 @@ VALUE_R = {
     'J': 9, 'Q': 10, 'K': 11, 'A': 12
 }
 
+# Количество комбинаций, оцениваемых за один вызов evaluate_batch.
+STATS_CHUNK_SIZE = 100000
+
 COMBINATION = {
     0: 'Старшая карта',
     1: 'Пара',
@@ -89,22 +104,23 @@ class Cards:
         )
 
 
-def generate_deck(without: Sequence[Card]) -> List[Card]:
+def generate_deck(without: Sequence[Card] | CardSet) -> List[Card]:
     """
     Функция для генерации колоды.
     :param without: набор карт, которые нужно исключиить из колоды.
     :return: список карт.
     """
+    without = as_card_set(without)
     deck = [
         Card(value, suit) for value in range(13) for suit in range(4)
-        if Card(value, suit) not in without
+        if (value, suit) not in without
     ]
     random.shuffle(deck)
     return deck
 
 
 def _generate_deck(
-    without: Sequence[tuple[int, int]] = []
+    without: Sequence[tuple[int, int]] | CardSet = []
 ) -> list[tuple[int, int]]:
     """
     Более быстрая функция для генерации колоды - принимает и генерирует не
@@ -112,255 +128,110 @@ def _generate_deck(
     :param without: набор карт, которые нужно исключиить из колоды.
     :return: список карт.
     """
-    deck = [
-        (value, suit) for value in range(13) for suit in range(4)
-        if (value, suit) not in without
-    ]
-    random.shuffle(deck)
-    return deck
-
-
-def _has_straight_combination(
-    ordered_card_values: Sequence[int]
-) -> list:
-    """
-    Функция определяет, присутствует ли в наборе карт стрит и определяет
-    его ранг (значение начальной карты). Принимает на вход упорядоченный
-    по возрастанию набор значений карт (не менее 5).
-    :param ordered_card_values: последовательность целых чисел от 0 до 12,
-        упорядоченная по возрастанию.
-    :return: список из двух значений True/False в зависимости от того,
-        содержится ли в комбинации стрит, и целое число - значение младшей
-        карты стрита, либо -1, если ответ False.
-    """
-    count = len(ordered_card_values)
-    if count < 5:
-        return [False, -1]
-    for bottom_card in range(count-5, -1, -1):
-        if (
-            ordered_card_values[bottom_card:bottom_card+5] ==
-            [i for i in range(ordered_card_values[bottom_card],
-                              ordered_card_values[bottom_card]+5)]
-        ):
-            return [True, ordered_card_values[bottom_card]]
-    low_straight = {0, 1, 2, 3, 12}
-    return [low_straight == set(ordered_card_values) & low_straight, -1]
-
-
-def _extract_flush(
-    cards: Sequence[List[int]],
-    suits: Dict[int, int]
-) -> List[int]:
-    """
-
-    :param cards:
-    :param suits:
-    :return:
-    """
-    count = len(cards[0])
-    suit = suits[max(suits.keys())]
-    return [cards[0][i] for i in range(count) if cards[1][i] == suit]
+    deck = Deck(without)
+    return deck.draw(len(deck))
 
 
-def _high_card_subrank(
-    ordered_card_values: list[int, int, int, int, int, int, int], *args
-) -> list[int, int, int, int, int]:
-    return ordered_card_values[::-1][:5]
+# Все карты колоды в порядке возрастания кода (см. evaluator.card_code).
+FULL_DECK = tuple((value, suit) for value in range(13) for suit in range(4))
 
 
-def _pair_subrank(
-    ordered_card_values: list[int, int, int, int, int, int, int],
-    grouped_values: list[int, int, int, int, int, int], *args
-) -> list[int, tuple[int, int, int]]:
+class Deck:
     """
-
-    :param ordered_card_values:
-    :param grouped_values:
-    :param args:
-    :return:
+    Колода для многократных раздач. Список живых карт (без исключенных)
+    строится один раз; каждая раздача перемешивает только ту часть
+    колоды, которую вытягивает (частичный алгоритм Фишера - Йейтса), и
+    колода не пересоздается между раздачами.
     """
-    pair_index = grouped_values.index(2)
-    pair_rank = ordered_card_values.pop(pair_index)
-    ordered_card_values.pop(pair_index)
-    return [pair_rank, tuple(ordered_card_values[::-1][:3])]
-
-
-def _two_pairs_subrank(
-    ordered_card_values: list[int, int, int, int, int, int, int],
-    grouped_values: list[int, int, int, int, int], *args
-) -> list[tuple[int, int], int]:
-    """
-
-    :param ordered_card_values:
-    :param grouped_values:
-    :param args:
-    :return:
-    """
-    low_pair_index = grouped_values.index(2)
-    grouped_values.pop(low_pair_index)
-    high_pair_index = grouped_values.index(2) + 2
-    grouped_values.pop(high_pair_index - 2)
-    if 2 in grouped_values:
-        low_pair_index, high_pair_index = high_pair_index, grouped_values.index(2) + 4
-    high_pair_rank = ordered_card_values.pop(high_pair_index)
-    ordered_card_values.pop(high_pair_index)
-    low_pair_rank = ordered_card_values.pop(low_pair_index)
-    ordered_card_values.pop(low_pair_index)
-    return [(high_pair_rank, low_pair_rank), ordered_card_values[-1]]
-
-
-def _triple_subrank(
-    ordered_card_values: list[int, int, int, int, int, int, int],
-    grouped_values: list[int, int, int, int, int], *args
-) -> list[int, tuple[int, int]]:
-    """
-
-    :param ordered_card_values:
-    :param grouped_values:
-    :param args:
-    :return:
-    """
-    triple_index = grouped_values.index(3)
-    triple_rank = ordered_card_values.pop(triple_index)
-    ordered_card_values.pop(triple_index)
-    ordered_card_values.pop(triple_index)
-    return [triple_rank, tuple(ordered_card_values[::-1][:2])]
-
-
-def _full_house_subrank(
-    ordered_card_values: list[int, int, int, int, int, int, int],
-    grouped_values: list[int, int, int] | list[int, int, int, int], *args
-) -> list[int, int]:
-    """
-
-    :param ordered_card_values:
-    :param grouped_values:
-    :param args:
-    :return:
-    """
-    if grouped_values.count(3) == 2:
-        return [ordered_card_values[5], ordered_card_values[1]]
-    triple_index = grouped_values.index(3)
-    if grouped_values.count(2) == 2:
-        return [
-            ordered_card_values[triple_index * 3],
-            ordered_card_values[-1 if triple_index < 2 else 2]
-        ]
-    pair_index = grouped_values.index(2)
-    return [
-        ordered_card_values[sum(grouped_values[:triple_index])],
-        ordered_card_values[sum(grouped_values[:pair_index])]
-    ]
-
-
-def _carre_subrank(
-    ordered_card_values: list[int, int, int, int, int, int, int],
-    grouped_values: list[int, int, int, int] | list[int, int, int] | list[int, int],
-    *args
-) -> list[int, int]:
-    if grouped_values[-1] == 4:
-        return [ordered_card_values[-1], ordered_card_values[2]]
-    carre_index = grouped_values.index(4)
-    return [
-        ordered_card_values[sum(grouped_values[:carre_index])],
-        ordered_card_values[-1]
-    ]
+    def __init__(
+        self,
+        without: Iterable[tuple[int, int]] | CardSet = (),
+        rng: random.Random | None = None
+    ) -> None:
+        """
+        :param without: карты, которые нужно исключить из колоды (в том
+            числе CardSet).
+        :param rng: генератор случайных чисел (по умолчанию - модуль random).
+        """
+        without = as_card_set(without)
+        self._cards = [card for card in FULL_DECK if card not in without]
+        self._random = (rng or random).random
+        self._position = 0
 
+    def shuffle(self) -> None:
+        """
+        Возвращает в колоду все вытянутые карты.
+        """
+        self._position = 0
 
-def _straight_subrank(
-    ordered_card_values: List[int], grouped_values: List[int],
-    straight_rank: int, *args
-) -> List[int]:
-    """
+    def draw(self, count: int = 1) -> list[tuple[int, int]]:
+        """
+        Вытягивает count случайных карт из оставшихся в колоде.
+        """
+        cards = self._cards
+        start = self._position
+        end = start + count
+        size = len(cards)
+        if end > size:
+            raise IndexError('Not enough cards in the deck')
+        rand = self._random
+        for index in range(start, end):
+            other = index + int(rand() * (size - index))
+            cards[index], cards[other] = cards[other], cards[index]
+        self._position = end
+        return cards[start:end]
+
+    def pop(self) -> tuple[int, int]:
+        """
+        Вытягивает одну случайную карту.
+        """
+        return self.draw(1)[0]
 
-    :param ordered_card_values:
-    :param grouped_values:
-    :param straight_rank:
-    :param args:
-    :return:
-    """
-    return [straight_rank]
+    def __len__(self) -> int:
+        return len(self._cards) - self._position
 
 
 def _calculate_max_value(
         seven_cards: Sequence[tuple[int, int]]
-) -> tuple:
+) -> int:
     """
     Функция принимает на вход комбинацию из 7 карт и возвращает ранг
     страршей комбинации из 5 карт.
     :param seven_cards: входящая комбинация из 7 карт, где карта - кортеж из
     целых чисел: перове число от 0 до 12 - номинал карты, второе - от 0 до
     3 - масть карты.
-    :return:
+    :return: целое число - сила комбинации (см. модуль evaluator), чем
+        больше, тем сильнее комбинация.
+    """
+    return evaluate_cards(seven_cards)
+
+
+def rank_to_cards(score: int) -> str:
+    main_rank, ranks = decode(score)
+    info = COMBINATION[main_rank]
+    if main_rank == 0 or main_rank == 5:
+        return info + ': ' + ''.join([VALUE[i] for i in ranks[::-1]])
+    if main_rank == 1:
+        return info + ': ' + VALUE[ranks[0]] * 2 + ''.join([VALUE[i] for i in ranks[1:][::-1]])
+    if main_rank == 2:
+        return info + ': ' + VALUE[ranks[1]] * 2 + VALUE[ranks[0]] * 2 + ''.join([VALUE[i] for i in ranks[2:]])
+    if main_rank == 3:
+        return info + ': ' + VALUE[ranks[0]] * 3 + ''.join([VALUE[i] for i in ranks[1:][::-1]])
+    if main_rank == 6:
+        return info + ': ' + VALUE[ranks[0]] * 3 + VALUE[ranks[1]] * 2
+    if main_rank == 7:
+        return info + ': ' + VALUE[ranks[0]] * 4 + ''.join([VALUE[i] for i in ranks[1:]])
+    return info + ': ' + ''.join([VALUE[i] for i in range(ranks[0] - 4, ranks[0] + 1)])
+
+
+def get_stats(n: int | None = None, workers: int | None = None) -> dict:
+    """
+    Частоты категорий комбинаций из 7 карт.
+    :param n: количество случайных комбинаций; если не задано, считаются
+        точные частоты полным перебором всех комбинаций (см. модуль
+        census).
+    :param workers: количество процессов для полного перебора.
     """
-    seven_cards = sorted(seven_cards, key=lambda x: x[0])
-
-    # Список, содержащий два списка: номиналов карт и соответствующих мастей
-    cards = [
-        [card[0] for card in seven_cards], [card[1] for card in seven_cards]
-    ]
-    card_values_count = [cards[0].count(i)
-                         for i in sorted(list(set(cards[0])))]
-    card_suits = {cards[1].count(i): i for i in set(cards[1])}
-    straight_rank = None
-    if max(card_suits.keys()) > 4:
-        cards[0] = _extract_flush(cards, card_suits)
-        has_straight_flush, straight_rank = _has_straight_combination(cards[0])
-        if has_straight_flush:
-            main_rank = 8
-        else:
-            main_rank = 5
-    elif 4 in card_values_count:
-        main_rank = 7
-    elif 3 in card_values_count:
-        if sorted(card_values_count)[-2] > 1:
-            main_rank = 6
-        else:
-            main_rank = 3
-    else:
-        has_straight, straight_rank = _has_straight_combination(cards[0])
-        if has_straight:
-            main_rank = 4
-        else:
-            main_rank = min(card_values_count.count(2), 2)
-
-    def_subrank = {
-        0: _high_card_subrank,
-        1: _pair_subrank,
-        2: _two_pairs_subrank,
-        3: _triple_subrank,
-        4: _straight_subrank,
-        5: _high_card_subrank,
-        6: _full_house_subrank,
-        7: _carre_subrank,
-        8: _straight_subrank
-    }
-    return tuple(
-        [main_rank]
-        + def_subrank[main_rank](
-            cards[0], card_values_count, straight_rank
-        )
-    )
-
-
-def rank_to_cards(score: tuple) -> str:
-    info = COMBINATION[score[0]]
-    if score[0] == 0 or score[0] == 5:
-        return info + ': ' + ''.join([VALUE[i] for i in score[1:][::-1]])
-    if score[0] == 1:
-        return info + ': ' + VALUE[score[1]] * 2 + ''.join([VALUE[i] for i in score[2][::-1]])
-    if score[0] == 2:
-        return info + ': ' + VALUE[score[1][1]] * 2 + VALUE[score[1][0]] * 2 + VALUE[score[2]]
-    if score[0] == 3:
-        return info + ': ' + VALUE[score[1]] * 3 + ''.join([VALUE[i] for i in score[2][::-1]])
-    if score[0] == 6:
-        return info + ': ' + VALUE[score[1]] * 3 + VALUE[score[2]] * 2
-    if score[0] == 7:
-        return info + ': ' + VALUE[score[1]] * 4 + VALUE[score[2]]
-    return info + ': ' + ''.join([VALUE[i] for i in range(score[1], score[1] + 5)])
-
-
-def get_stats(n: int) -> dict:
     names = {
         0: 'Старшая карта',
         1: 'Пара',
@@ -383,51 +254,116 @@ def get_stats(n: int) -> dict:
         'Каре': [0, '0.00%'],
         'Стрит-флаш': [0, '0.00%'],
     }
-    for _ in range(n):
-        hand = _calculate_max_value(_generate_deck()[:7])
-        stats[names[hand[0]]][0] += 1
+    if n is None:
+        n = CENSUS_HANDS_COUNT
+        counts = census(workers=workers)
+    else:
+        counts = np.zeros(9, dtype=np.int64)
+        rng = np.random.default_rng()
+        for start in range(0, n, STATS_CHUNK_SIZE):
+            size = min(STATS_CHUNK_SIZE, n - start)
+            hands = rng.random((size, 52)).argsort(axis=1)[:, :7]
+            counts += np.bincount(
+                evaluate_batch(hands) >> CATEGORY_SHIFT, minlength=9
+            )
+    for main_rank, count in enumerate(counts.tolist()):
+        stats[names[main_rank]][0] += count
     for key in stats.keys():
         stats[key][1] = f'{stats[key][0] * 100 / n:.04}%'
     return stats
 
 
-def emulate_deal(
-        hand: Tuple[Tuple[int, int]],
-        players_count: int,
-        table: Tuple[Tuple[int, int]] = None
-):
-    if table:
-        deck = _generate_deck(list(hand) + list(table))
-        table_card_count = len(table)
-    else:
-        deck = _generate_deck(hand)
-        table_card_count = 0
-        table = ()
-    this_table = list(table)
-    cards_to_other = [deck[i * 2:i * 2 + 2] for i in range(players_count - 1)]
-    this_table += deck[47 + table_card_count:]
-    hands = [list(hand) + this_table] + [i + this_table for i in cards_to_other]
-    score = [_calculate_max_value(hand) for hand in hands]
-    return int(score.index(max(score)) == 0)
+def p_win_key(
+    hand: tuple | list,
+    players_count: int,
+    table: tuple = None,
+    n: int = 100000,
+    seed: int | None = None,
+    workers: int = 1,
+    half_width: float | None = None,
+    time_limit: float | None = None
+) -> tuple:
+    """
+    Ключ кэша cache.equity_cache, под которым _calculate_p_win с теми же
+    параметрами сохраняет результат. seed и workers входят в ключ: от них
+    зависит последовательность раздач, и воспроизводимый расчет не должен
+    возвращать результат, полученный с другим зерном.
+    """
+    return equity_cache.key(
+        hand, players_count, table, (n, seed, workers, half_width, time_limit)
+    )
 
 
-def _calculate_p_win(hand: tuple | list, players_count: int, table: tuple = None, n: int = 100000):
-    score = 0
-    for _ in range(n):
-        score += emulate_deal(hand, players_count, table)
-    return score * 100 / n
+def _calculate_p_win(
+    hand: tuple | list,
+    players_count: int,
+    table: tuple = None,
+    n: int = 100000,
+    seed: int | None = None,
+    workers: int = 1,
+    half_width: float | None = None,
+    time_limit: float | None = None
+):
+    """
+    Вероятность выигрыша руки (в процентах) против players_count - 1
+    соперников со случайными картами. Ничья учитывается как доля банка.
+    На пре-флопе результат берется из готовой таблицы (см. модуль
+    preflop), на поздних стадиях, когда это дешевле, считается точно
+    перебором всех вариантов (см. equity.calculate).
+    :param hand: две карты игрока.
+    :param players_count: количество игроков, включая игрока.
+    :param table: карты на столе, если они есть.
+    :param n: количество разыгрываемых раздач.
+    :param seed: зерно генератора случайных чисел.
+    :param workers: количество процессов, между которыми делятся раздачи.
+    :param half_width: если задана, раздачи разыгрываются до достижения
+        такой полуширины 95%-го доверительного интервала (в долях банка),
+        но не более n (см. equity.estimate).
+    :param time_limit: если задано, расчет прекращается через time_limit
+        секунд с лучшей полученной оценкой.
+    Результаты сохраняются в общем кэше cache.equity_cache.
+    """
+    key = p_win_key(
+        hand, players_count, table, n, seed, workers, half_width, time_limit
+    )
+    p = equity_cache.get(key)
+    if p is not None:
+        return p
+    entry = None
+    if not table:
+        preflop_table = get_table()
+        if preflop_table is not None:
+            entry = preflop_table.lookup(hand, players_count)
+    if entry is not None:
+        p = entry[0] * 100
+    elif half_width is not None or time_limit is not None:
+        p = estimate(
+            hand, players_count, table, half_width, time_limit,
+            max_samples=n, rng=np.random.default_rng(seed)
+        ).equity * 100
+    else:
+        p = calculate(hand, players_count, table, n, seed, workers).equity * 100
+    equity_cache.set(key, p)
+    return p
 
 
 def main():
-    for n in range(2, 9):
-        for i in range(13):
-            for j in range(i+1, 13):
-                p = _calculate_p_win(((i, 0), (j, 1)), n, None, 100000)
-                print(f'Players: {n}, cards: {Card(i, 0)}{Card(j, 1)}: {p:.04}%')
-                p = _calculate_p_win(((i, 0), (j, 0)), n, None, 100000)
-                print(f'Players: {n}, cards: {Card(i, 0)}{Card(j, 0)}: {p:.04}%')
-            p = _calculate_p_win(((i, 0), (i, 1)), n, None, 100000)
-            print(f'Players: {n}, cards: {Card(i, 0)}{Card(i, 1)}: {p:.04}%')
+    """
+    Печатает таблицу вероятностей выигрыша до флопа (таблица строится
+    отдельно: python preflop.py).
+    """
+    table = get_table()
+    if table is None:
+        print('Preflop table is not available, build it with: python preflop.py')
+        return
+    for n in range(MIN_PLAYERS, MAX_PLAYERS + 1):
+        for index in range(HANDS_COUNT):
+            hand = representative(index)
+            p, stderr = table.lookup(hand, n)
+            print(
+                f'Players: {n}, cards: {Card(*hand[0])}{Card(*hand[1])}: '
+                f'{p * 100:.04}% (±{stderr * 100:.02}%)'
+            )
 
 
 if __name__ == '__main__':
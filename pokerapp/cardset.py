@@ -0,0 +1,138 @@
+"""
+Множество карт в виде 52-битной маски.
+
+Карта (<номинал>, <масть>) соответствует биту suit * 13 + value - так же,
+как в векторном оценщике (см. evaluator.evaluate_batch), поэтому 13 бит
+каждой масти образуют маску номиналов этой масти. Объединение,
+пересечение, проверка принадлежности и количество карт - одна операция
+над целым числом вместо прохода по списку кортежей.
+"""
+import typing
+
+
+RANKS_MASK = 0x1FFF
+
+
+class CardSet(int):
+    """
+    Неизменяемое множество карт. Итерация дает карты-кортежи
+    (<номинал>, <масть>) по возрастанию бита; объекты cards.Card
+    принимаются везде, где ожидается карта.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_cards(cls, cards: typing.Iterable) -> 'CardSet':
+        """
+        :param cards: карты-кортежи (<номинал>, <масть>) или объекты Card.
+        """
+        mask = 0
+        for card in cards:
+            if isinstance(card, tuple):
+                mask |= 1 << (card[1] * 13 + card[0])
+            else:
+                mask |= 1 << (card.suit * 13 + card.value)
+        return cls(mask)
+
+    @classmethod
+    def from_codes(cls, codes: typing.Iterable[int]) -> 'CardSet':
+        """
+        :param codes: коды карт value * 4 + suit (см. evaluator.card_code).
+        """
+        mask = 0
+        for code in codes:
+            mask |= 1 << ((code & 3) * 13 + (code >> 2))
+        return cls(mask)
+
+    def to_cards(self) -> typing.List[typing.Tuple[int, int]]:
+        return list(self)
+
+    def codes(self) -> typing.List[int]:
+        """
+        Коды карт value * 4 + suit - формат evaluator.evaluate.
+        """
+        return [value * 4 + suit for value, suit in self]
+
+    def suit_mask(self, suit: int) -> int:
+        """
+        13-битная маска номиналов карт масти suit.
+        """
+        return int(self) >> (suit * 13) & RANKS_MASK
+
+    def rank_mask(self) -> int:
+        """
+        13-битная маска номиналов, встречающихся в любой масти.
+        """
+        mask = int(self)
+        return (mask | mask >> 13 | mask >> 26 | mask >> 39) & RANKS_MASK
+
+    def union(self, other: typing.Iterable) -> 'CardSet':
+        return self | as_card_set(other)
+
+    def intersection(self, other: typing.Iterable) -> 'CardSet':
+        return self & as_card_set(other)
+
+    def difference(self, other: typing.Iterable) -> 'CardSet':
+        return self - as_card_set(other)
+
+    def isdisjoint(self, other: typing.Iterable) -> bool:
+        return not int(self) & as_card_set(other)
+
+    def add(self, card) -> 'CardSet':
+        """
+        Множество с добавленной картой (исходное не меняется).
+        """
+        return self | CardSet.from_cards((card,))
+
+    def __or__(self, other: int) -> 'CardSet':
+        return CardSet(int(self) | other)
+
+    def __and__(self, other: int) -> 'CardSet':
+        return CardSet(int(self) & other)
+
+    def __xor__(self, other: int) -> 'CardSet':
+        return CardSet(int(self) ^ other)
+
+    def __sub__(self, other: int) -> 'CardSet':
+        return CardSet(int(self) & ~other)
+
+    __ror__ = __or__
+    __rand__ = __and__
+    __rxor__ = __xor__
+
+    def __contains__(self, card) -> bool:
+        if isinstance(card, tuple):
+            return bool(int(self) >> (card[1] * 13 + card[0]) & 1)
+        return bool(int(self) >> (card.suit * 13 + card.value) & 1)
+
+    def __len__(self) -> int:
+        return int(self).bit_count()
+
+    def __iter__(self) -> typing.Iterator[typing.Tuple[int, int]]:
+        mask = int(self)
+        while mask:
+            lowest = mask & -mask
+            bit = lowest.bit_length() - 1
+            yield bit % 13, bit // 13
+            mask ^= lowest
+
+    def __bool__(self) -> bool:
+        return int(self) != 0
+
+    def __repr__(self) -> str:
+        return f'CardSet({self.to_cards()})'
+
+
+def as_card_set(cards: typing.Iterable | None) -> CardSet:
+    """
+    CardSet из множества карт, последовательности кортежей или Card.
+    """
+    if isinstance(cards, CardSet):
+        return cards
+    if isinstance(cards, int):
+        return CardSet(cards)
+    return CardSet.from_cards(cards or ())
+
+
+EMPTY = CardSet(0)
+FULL_DECK_SET = CardSet((1 << 52) - 1)
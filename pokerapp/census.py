@@ -0,0 +1,172 @@
+"""
+Полный перебор всех C(52, 7) = 133 784 560 комбинаций из 7 карт с
+подсчетом количества комбинаций каждой категории.
+
+Карты нумеруются битами 52-битной маски (см. cardset.CardSet). Перебор
+делится на задания по двум младшим картам комбинации (a < b): остальные
+пять карт - любые пять бит старше b. Маски всех пятерок заранее
+строятся в колексикографическом порядке, в котором пятерки из бит
+0..m-1 образуют начало списка, поэтому пятерки для задания - это начало
+общего списка, сдвинутое на b + 1 бит. Маски оцениваются векторно
+(evaluator.evaluate_masks) блоками по CENSUS_BLOCK_SIZE.
+
+Задания выполняются в пуле процессов; после каждых CHECKPOINT_EVERY
+заданий счетчики и список выполненных заданий сохраняются в файл, и
+прерванный перебор продолжается с места остановки.
+
+Точные количества известны (KNOWN_COUNTS), поэтому перебор служит и
+проверкой оценщика, и замером его скорости:
+python census.py [<файл контрольной точки>] [<количество процессов>]
+"""
+import concurrent.futures
+import functools
+import logging
+import math
+import os
+import sys
+import time
+import typing
+
+import numpy as np
+
+from evaluator import CATEGORY_SHIFT, evaluate_masks
+
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES_COUNT = 9
+HANDS_COUNT = math.comb(52, 7)
+KNOWN_COUNTS = (
+    23294460, 58627800, 31433400, 6461620, 6180020, 4047644, 3473184,
+    224848, 41584
+)
+
+# Количество комбинаций, оцениваемых за один вызов evaluate_masks.
+CENSUS_BLOCK_SIZE = 500000
+CHECKPOINT_EVERY = 50
+
+
+def colex_masks(size: int, bits: int = 52) -> np.ndarray:
+    """
+    Маски всех сочетаний из bits бит по size в колексикографическом
+    порядке (по возрастанию старшего бита, затем - следующего и т.д.).
+    """
+    masks = np.zeros(1, dtype=np.int64)
+    for length in range(1, size + 1):
+        masks = np.concatenate([
+            masks[:math.comb(top, length - 1)] | np.int64(1 << top)
+            for top in range(length - 1, bits)
+        ])
+    return masks
+
+
+@functools.lru_cache(maxsize=1)
+def _five_card_masks() -> np.ndarray:
+    return colex_masks(5)
+
+
+def count_pair(low: int, high: int) -> np.ndarray:
+    """
+    Количества комбинаций каждой категории среди всех семерок, младшие
+    карты которых - биты low < high.
+    """
+    fives = _five_card_masks()[:math.comb(51 - high, 5)]
+    base = np.int64((1 << low) | (1 << high))
+    counts = np.zeros(CATEGORIES_COUNT, dtype=np.int64)
+    for start in range(0, fives.size, CENSUS_BLOCK_SIZE):
+        hands = (fives[start:start + CENSUS_BLOCK_SIZE] << (high + 1)) | base
+        counts += np.bincount(
+            evaluate_masks(hands) >> CATEGORY_SHIFT,
+            minlength=CATEGORIES_COUNT
+        )
+    return counts
+
+
+def _count_pairs(
+    pairs: typing.Sequence[typing.Tuple[int, int]]
+) -> typing.List[typing.Tuple[int, int, np.ndarray]]:
+    return [(low, high, count_pair(low, high)) for low, high in pairs]
+
+
+def _load_checkpoint(path: str | None) -> typing.Tuple[np.ndarray, np.ndarray]:
+    if path is not None and os.path.exists(path):
+        with np.load(path) as checkpoint:
+            return checkpoint['done'].copy(), checkpoint['counts'].copy()
+    return (
+        np.zeros((52, 52), dtype=bool),
+        np.zeros(CATEGORIES_COUNT, dtype=np.int64)
+    )
+
+
+def _save_checkpoint(path: str | None, done: np.ndarray, counts: np.ndarray) -> None:
+    if path is None:
+        return
+    with open(path + '.tmp', 'wb') as checkpoint_file:
+        np.savez(checkpoint_file, done=done, counts=counts)
+    os.replace(path + '.tmp', path)
+
+
+def census(
+    checkpoint: str | None = None,
+    workers: int | None = None,
+    pairs_per_task: int = 4
+) -> np.ndarray:
+    """
+    Полный перебор семикарточных комбинаций.
+    :param checkpoint: файл контрольной точки (.npz); если он есть,
+        перебор продолжается с сохраненного состояния.
+    :param workers: количество процессов (1 - без пула).
+    :param pairs_per_task: количество пар младших карт в одном задании.
+    :return: массив из 9 чисел - количества комбинаций каждой категории.
+    """
+    done, counts = _load_checkpoint(checkpoint)
+    pairs = [
+        (low, high) for high in range(1, 47) for low in range(high)
+        if not done[low, high]
+    ]
+    tasks = [
+        pairs[start:start + pairs_per_task]
+        for start in range(0, len(pairs), pairs_per_task)
+    ]
+    started = time.monotonic()
+    evaluated = 0
+    if workers == 1:
+        results = map(_count_pairs, tasks)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+        results = (
+            future.result() for future in concurrent.futures.as_completed(
+                [executor.submit(_count_pairs, task) for task in tasks]
+            )
+        )
+    try:
+        for task_number, result in enumerate(results, 1):
+            for low, high, pair_counts in result:
+                done[low, high] = True
+                counts += pair_counts
+                evaluated += int(pair_counts.sum())
+            if task_number % CHECKPOINT_EVERY == 0:
+                _save_checkpoint(checkpoint, done, counts)
+                logger.info(
+                    'Census: %s/%s tasks, %.0f hands/s', task_number,
+                    len(tasks), evaluated / (time.monotonic() - started)
+                )
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        _save_checkpoint(checkpoint, done, counts)
+    return counts
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    started = time.monotonic()
+    result = census(
+        sys.argv[1] if len(sys.argv) > 1 else None,
+        int(sys.argv[2]) if len(sys.argv) > 2 else None
+    )
+    elapsed = time.monotonic() - started
+    for category, (count, known) in enumerate(zip(result.tolist(), KNOWN_COUNTS)):
+        print(f'{category}: {count} {"OK" if count == known else f"!= {known}"}')
+    print(f'Total: {int(result.sum())}, {elapsed:.1f}s')
@@ -1,4 +1,9 @@
+import atexit
+import logging
+import logging.config
+import logging.handlers
 import os
+import queue
 
 from dotenv import load_dotenv
 
@@ -9,6 +14,26 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 LOG_FILENAME = 'game.log'
 
+HISTORY_FILENAME = 'game_history.bin'
+
+PREFLOP_TABLE_PATH = os.path.join(BASE_DIR, 'sources', 'preflop_equity.bin')
+
+EQUITY_CACHE_SIZE = int(os.getenv('EQUITY_CACHE_SIZE', 100000))
+EQUITY_CACHE_TTL = float(os.getenv('EQUITY_CACHE_TTL', 3600))
+
+# Пул процессов для расчетов телеграм-бота: количество процессов и
+# максимальное количество расчетов в очереди.
+CALCULATION_WORKERS = int(os.getenv('CALCULATION_WORKERS', os.cpu_count()))
+CALCULATION_QUEUE_SIZE = int(os.getenv('CALCULATION_QUEUE_SIZE', 1000))
+
+# Хранилище состояния диалогов телеграм-бота: 'memory' или 'sqlite'.
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory')
+STATE_PATH = os.getenv('STATE_PATH', 'chat_state.sqlite3')
+STATE_SIZE = int(os.getenv('STATE_SIZE', 100000))
+STATE_TTL = float(os.getenv('STATE_TTL', 86400))
+# Количество изменений, записываемых в SQLite одной транзакцией (1 - сразу).
+STATE_BATCH_SIZE = int(os.getenv('STATE_BATCH_SIZE', 1))
+
 LOGGING_CONFIG = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -57,6 +82,48 @@ LOGGING_CONFIG = {
     'root': {'level': 'DEBUG', 'handlers': ['logfile', 'stream']}
 }
 
+# Уровни логирования отдельных модулей, например
+# LOG_LEVELS=game=WARNING,equity=DEBUG. В симуляциях достаточно поднять
+# уровень модуля game, чтобы записи о раздачах не формировались вовсе.
+LOG_LEVELS = dict(
+    item.split('=', 1)
+    for item in os.getenv('LOG_LEVELS', '').split(',') if '=' in item
+)
+for _module, _level in LOG_LEVELS.items():
+    LOGGING_CONFIG['loggers'].setdefault(_module, {})['level'] = _level
+
 TELEGRAM_TOKEN = os.getenv('TOKEN')
 
 RETRY_TIME = 600
+
+_log_listener = None
+
+
+def setup_logging(config: dict = LOGGING_CONFIG) -> None:
+    """
+    Применяет конфигурацию логирования так, чтобы запись в файл и вывод
+    в консоль выполнялись в отдельном потоке: обработчики корневого
+    логгера переносятся в QueueListener, а сам логгер получает
+    QueueHandler, который лишь кладет запись в очередь.
+    """
+    global _log_listener
+    logging.config.dictConfig(config)
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    _stop_logging()
+    log_queue = queue.SimpleQueue()
+    _log_listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    _log_listener.start()
+
+
+@atexit.register
+def _stop_logging() -> None:
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
@@ -0,0 +1,578 @@
+"""
+Векторный расчет вероятности выигрыша методом Монте-Карло.
+
+Раздачи разыгрываются блоками: для блока из count испытаний за один раз
+выбираются карты соперников и недостающие карты стола (NumPy Generator),
+все руки блока оцениваются одним вызовом evaluate_batch, а результаты
+сводятся к числу выигрышей и долей банка при ничьих.
+
+При 3-5 картах на столе число вариантов невелико, и вместо случайных
+раздач можно перебрать все варианты недостающих карт стола и рук
+соперников (exact). Функция calculate оценивает стоимость перебора и
+выбирает между перебором и методом Монте-Карло.
+
+Функция parallel_monte_carlo делит раздачи между процессами пула; каждый
+процесс получает собственный поток случайных чисел, порожденный из общего
+зерна (SeedSequence.spawn), поэтому при одинаковых зерне и количестве
+процессов результат воспроизводим.
+
+Функция multiway_equity за один проход считает доли банка всех игроков с
+известными картами: каждый вариант стола оценивается сразу для всех рук.
+
+Функция estimate считает блоками и останавливается, как только достигнута
+заданная точность (полуширина доверительного интервала) или истекло
+отведенное время.
+"""
+import concurrent.futures
+import functools
+import itertools
+import math
+import os
+import statistics
+import time
+import typing
+
+import numpy as np
+
+from canonical import canonicalize
+from evaluator import card_code, code_to_card, evaluate_batch
+
+
+DEFAULT_BLOCK_SIZE = 20000
+
+# Перебор выбирается, если его стоимость (в оцениваемых комбинациях и
+# проверяемых наборах рук соперников) не больше стоимости Монте-Карло,
+# умноженной на этот коэффициент: точный ответ ценнее приближенного.
+EXACT_COST_FACTOR = 10
+
+# Максимальное количество элементов промежуточных массивов при переборе.
+EXACT_CHUNK_SIZE = 4000000
+
+# Если вариантов добора стола не больше этого числа, multiway_equity
+# перебирает их все, иначе разыгрывает случайные.
+MULTIWAY_EXACT_LIMIT = 20000
+
+# Размер блока и минимальное количество раздач для estimate.
+ADAPTIVE_BLOCK_SIZE = 5000
+ADAPTIVE_MIN_SAMPLES = 5000
+
+
+class EquityResult(typing.NamedTuple):
+    """
+    Результат расчета для руки игрока.
+    :samples: количество разыгранных раздач;
+    :wins: количество раздач, выигранных единолично;
+    :ties: сумма долей банка в раздачах, закончившихся ничьей;
+    :squares: сумма квадратов результатов раздач (для оценки погрешности);
+    :exact: результат получен полным перебором, погрешность равна нулю.
+    """
+    samples: int
+    wins: float
+    ties: float
+    squares: float
+    exact: bool = False
+
+    @property
+    def equity(self) -> float:
+        """
+        Доля банка, в среднем приходящаяся на руку игрока (от 0 до 1).
+        """
+        if not self.samples:
+            return 0.0
+        return (self.wins + self.ties) / self.samples
+
+    @property
+    def stderr(self) -> float:
+        """
+        Стандартная ошибка оценки equity.
+        """
+        if self.exact or self.samples < 2:
+            return 0.0
+        variance = max(self.squares / self.samples - self.equity ** 2, 0.0)
+        return (variance / (self.samples - 1)) ** 0.5
+
+    def __add__(self, other: 'EquityResult') -> 'EquityResult':
+        return EquityResult(
+            *(a + b for a, b in zip(self[:4], other[:4])),
+            exact=self.exact and other.exact
+        )
+
+
+EMPTY_RESULT = EquityResult(0, 0.0, 0.0, 0.0)
+EMPTY_EXACT_RESULT = EquityResult(0, 0.0, 0.0, 0.0, exact=True)
+
+
+def to_codes(cards: typing.Iterable[typing.Tuple[int, int]] | None) -> np.ndarray:
+    """
+    Переводит карты-кортежи (<номинал>, <масть>) в массив кодов.
+    """
+    return np.array(
+        [card_code(card) for card in cards or ()], dtype=np.int8
+    )
+
+
+def live_cards(*known: np.ndarray) -> np.ndarray:
+    """
+    Коды карт колоды за исключением известных.
+    """
+    live = np.ones(52, dtype=bool)
+    for codes in known:
+        live[codes] = False
+    return np.flatnonzero(live).astype(np.int8)
+
+
+def sample_cards(
+    rng: np.random.Generator, live: np.ndarray, count: int, need: int
+) -> np.ndarray:
+    """
+    Для каждого из count испытаний выбирает need различных карт из live
+    первыми need шагами тасования Фишера-Йетса, выполняемыми сразу для
+    всех испытаний.
+    :return: массив формы (count, need).
+    """
+    deck = np.broadcast_to(live, (count, live.size)).copy()
+    rows = np.arange(count)
+    for i in range(need):
+        j = rng.integers(i, live.size, size=count)
+        picked = deck[rows, j]
+        deck[rows, j] = deck[:, i]
+        deck[:, i] = picked
+    return deck[:, :need]
+
+
+def deal_block(
+    rng: np.random.Generator,
+    hand: np.ndarray,
+    board: np.ndarray,
+    players_count: int,
+    count: int,
+    live: np.ndarray | None = None
+) -> np.ndarray:
+    """
+    Разыгрывает count раздач: добирает стол до 5 карт и раздает карты
+    соперникам.
+    :param hand: коды двух карт игрока.
+    :param board: коды известных карт стола.
+    :param live: карты, из которых идет добор (по умолчанию - колода без
+        карт игрока и стола).
+    :return: массив формы (count, players_count, 7) - семикарточные
+        комбинации всех игроков, рука игрока - первая.
+    """
+    if live is None:
+        live = live_cards(hand, board)
+    opponents = players_count - 1
+    drawn = sample_cards(rng, live, count, 2 * opponents + 5 - board.size)
+    boards = np.concatenate(
+        [np.broadcast_to(board, (count, board.size)), drawn[:, 2 * opponents:]],
+        axis=1
+    )
+    hands = np.concatenate(
+        [
+            np.broadcast_to(hand, (count, 1, 2)),
+            drawn[:, :2 * opponents].reshape(count, opponents, 2)
+        ],
+        axis=1
+    )
+    return np.concatenate(
+        [hands, np.broadcast_to(boards[:, None, :], (count, players_count, 5))],
+        axis=2
+    )
+
+
+def score_block(
+    strength: np.ndarray, weights: np.ndarray | None = None
+) -> EquityResult:
+    """
+    Сводит силу комбинаций блока раздач к результату первого игрока.
+    :param strength: массив формы (count, players_count).
+    :param weights: кратность каждой раздачи (по умолчанию - 1).
+    """
+    hero = strength[:, 0]
+    if weights is None:
+        weights = np.ones(hero.size, dtype=np.int64)
+    if strength.shape[1] == 1:
+        total = float(weights.sum())
+        return EquityResult(int(total), total, 0.0, total)
+    best = strength[:, 1:].max(axis=1)
+    wins = hero > best
+    tied = hero == best
+    share = tied / (1 + (strength[:, 1:] == hero[:, None]).sum(axis=1))
+    return EquityResult(
+        int(weights.sum()),
+        float(wins @ weights),
+        float(share @ weights),
+        float((wins + share ** 2) @ weights)
+    )
+
+
+def evaluate_block(block: np.ndarray) -> np.ndarray:
+    """
+    Сила комбинаций блока раздач формы (count, players_count, 7).
+    """
+    count, players_count, _ = block.shape
+    return evaluate_batch(block.reshape(-1, 7)).reshape(count, players_count)
+
+
+def monte_carlo(
+    hand: typing.Sequence[typing.Tuple[int, int]],
+    players_count: int,
+    table: typing.Sequence[typing.Tuple[int, int]] | None = None,
+    n: int = 100000,
+    rng: np.random.Generator | None = None,
+    block_size: int = DEFAULT_BLOCK_SIZE
+) -> EquityResult:
+    """
+    Оценивает долю банка руки игрока против players_count - 1 соперников
+    со случайными картами.
+    :param hand: две карты игрока.
+    :param players_count: количество игроков в раздаче, включая игрока.
+    :param table: известные карты стола (0-5 карт).
+    :param n: количество разыгрываемых раздач.
+    :param rng: генератор случайных чисел NumPy.
+    :param block_size: количество раздач, разыгрываемых за один блок.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    hand_codes = to_codes(hand)
+    board = to_codes(table)
+    live = live_cards(hand_codes, board)
+    result = EMPTY_RESULT
+    for start in range(0, n, block_size):
+        block = deal_block(
+            rng, hand_codes, board, players_count,
+            min(block_size, n - start), live
+        )
+        result += score_block(evaluate_block(block))
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def _pairs(size: int) -> np.ndarray:
+    """
+    Все пары позиций из size карт, форма (C(size, 2), 2).
+    """
+    return np.array(list(itertools.combinations(range(size), 2)), dtype=np.intp)
+
+
+@functools.lru_cache(maxsize=None)
+def _disjoint_pair_sets(size: int, opponents: int) -> np.ndarray:
+    """
+    Все неупорядоченные наборы из opponents непересекающихся пар позиций
+    из size карт - номера пар из _pairs(size), форма (N, opponents).
+    """
+    pairs = _pairs(size)
+    pair_numbers = np.arange(len(pairs), dtype=np.intp)
+    pair_masks = (1 << pairs[:, 0]) | (1 << pairs[:, 1])
+    sets = pair_numbers[:, None]
+    used = pair_masks.copy()
+    step = max(1, EXACT_CHUNK_SIZE // len(pairs))
+    for _ in range(opponents - 1):
+        parts, masks = [], []
+        for start in range(0, len(sets), step):
+            left, right = np.nonzero(
+                (pair_numbers[None, :] > sets[start:start + step, -1:])
+                & ((used[start:start + step, None] & pair_masks[None, :]) == 0)
+            )
+            parts.append(
+                np.concatenate([sets[start + left], right[:, None]], axis=1)
+            )
+            masks.append(used[start + left] | pair_masks[right])
+        sets, used = np.concatenate(parts), np.concatenate(masks)
+    return sets
+
+
+def exact_cost(players_count: int, board_size: int) -> int:
+    """
+    Стоимость полного перебора: количество вариантов стола, умноженное на
+    количество рук одного соперника и наборов рук всех соперников.
+    """
+    opponents = players_count - 1
+    boards = math.comb(50 - board_size, 5 - board_size)
+    if not opponents:
+        return boards
+    # После раздачи стола в колоде всегда остается 45 карт.
+    sets = (
+        math.comb(45, 2 * opponents) * math.factorial(2 * opponents)
+        // (2 ** opponents * math.factorial(opponents))
+    )
+    return boards * (math.comb(45, 2) + sets * opponents)
+
+
+def _distinct_runouts(
+    hand: typing.Sequence[typing.Tuple[int, int]],
+    table: typing.Sequence[typing.Tuple[int, int]] | None,
+    live: np.ndarray,
+    missing: int
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Варианты добора стола из live с точностью до перестановки мастей.
+    :return: номера добираемых карт в live формы (N, missing) и
+        количество вариантов, совпадающих с каждым из них.
+    """
+    live_tuples = [code_to_card(code) for code in live.tolist()]
+    table = list(table or ())
+    groups = {}
+    for runout in itertools.combinations(range(live.size), missing):
+        key = canonicalize(hand, table + [live_tuples[i] for i in runout])
+        if key in groups:
+            groups[key][1] += 1
+        else:
+            groups[key] = [runout, 1]
+    runouts = np.array(
+        [runout for runout, _ in groups.values()], dtype=np.intp
+    ).reshape(len(groups), missing)
+    weights = np.array([weight for _, weight in groups.values()], dtype=np.int64)
+    return runouts, weights
+
+
+def exact(
+    hand: typing.Sequence[typing.Tuple[int, int]],
+    players_count: int,
+    table: typing.Sequence[typing.Tuple[int, int]] | None = None
+) -> EquityResult:
+    """
+    Точная доля банка руки игрока: перебираются все варианты недостающих
+    карт стола и все наборы рук players_count - 1 соперников. Варианты
+    стола, совпадающие с точностью до перестановки мастей, считаются один
+    раз с соответствующим весом.
+    Параметры - как у monte_carlo.
+    """
+    hand_codes = to_codes(hand)
+    board = to_codes(table)
+    live = live_cards(hand_codes, board)
+    opponents = players_count - 1
+    missing = 5 - board.size
+    runouts, runout_weights = _distinct_runouts(hand, table, live, missing)
+    size = live.size - missing
+    pairs = _pairs(size)
+    sets = _disjoint_pair_sets(size, opponents) if opponents else None
+    per_board = len(pairs) + (len(sets) * opponents if opponents else 0)
+    chunk = max(1, EXACT_CHUNK_SIZE // per_board)
+
+    result = EMPTY_EXACT_RESULT
+    for start in range(0, len(runouts), chunk):
+        chunk_runouts = runouts[start:start + chunk]
+        chunk_weights = runout_weights[start:start + chunk]
+        count = len(chunk_runouts)
+        remaining = np.ones((count, live.size), dtype=bool)
+        remaining[np.arange(count)[:, None], chunk_runouts] = False
+        rest = np.broadcast_to(live, (count, live.size))[remaining].reshape(count, size)
+        boards = np.concatenate(
+            [np.broadcast_to(board, (count, board.size)), live[chunk_runouts]],
+            axis=1
+        )
+        hero = evaluate_batch(
+            np.concatenate([np.broadcast_to(hand_codes, (count, 2)), boards], axis=1)
+        )
+        if not opponents:
+            result += score_block(hero[:, None], chunk_weights)._replace(exact=True)
+            continue
+        holdings = rest[:, pairs]
+        strength = evaluate_batch(
+            np.concatenate(
+                [
+                    holdings.reshape(-1, 2),
+                    np.repeat(boards, len(pairs), axis=0)
+                ],
+                axis=1
+            )
+        ).reshape(count, len(pairs))
+        # Сила рук соперников в каждом наборе: (count * len(sets), opponents)
+        block = np.concatenate(
+            [hero[:, None, None].repeat(len(sets), axis=1), strength[:, sets]],
+            axis=2
+        ).reshape(-1, players_count)
+        result += score_block(
+            block, np.repeat(chunk_weights, len(sets))
+        )._replace(exact=True)
+    return result
+
+
+_executor = None
+
+
+def get_executor() -> concurrent.futures.ProcessPoolExecutor:
+    """
+    Общий пул процессов для расчетов, создаваемый при первом обращении.
+    """
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ProcessPoolExecutor(os.cpu_count())
+    return _executor
+
+
+def _monte_carlo_part(
+    hand: typing.Sequence[typing.Tuple[int, int]],
+    players_count: int,
+    table: typing.Sequence[typing.Tuple[int, int]] | None,
+    n: int,
+    seed_sequence: np.random.SeedSequence
+) -> EquityResult:
+    return monte_carlo(
+        hand, players_count, table, n, np.random.default_rng(seed_sequence)
+    )
+
+
+def parallel_monte_carlo(
+    hand: typing.Sequence[typing.Tuple[int, int]],
+    players_count: int,
+    table: typing.Sequence[typing.Tuple[int, int]] | None = None,
+    n: int = 100000,
+    seed: int | None = None,
+    workers: int | None = None,
+    executor: concurrent.futures.Executor | None = None
+) -> EquityResult:
+    """
+    monte_carlo, разделенный на workers частей, которые считаются в пуле
+    процессов, после чего результаты частей складываются.
+    :param seed: зерно; при одинаковых seed и workers результат совпадает.
+    :param workers: количество частей (по умолчанию - количество ядер).
+    :param executor: пул, в котором считаются части (по умолчанию - общий
+        пул get_executor()).
+    """
+    workers = workers or os.cpu_count()
+    executor = executor or get_executor()
+    streams = np.random.SeedSequence(seed).spawn(workers)
+    futures = [
+        executor.submit(
+            _monte_carlo_part, hand, players_count, table,
+            n // workers + (part < n % workers), stream
+        )
+        for part, stream in enumerate(streams)
+    ]
+    result = EMPTY_RESULT
+    for future in futures:
+        result += future.result()
+    return result
+
+
+def calculate(
+    hand: typing.Sequence[typing.Tuple[int, int]],
+    players_count: int,
+    table: typing.Sequence[typing.Tuple[int, int]] | None = None,
+    n: int = 100000,
+    seed: int | None = None,
+    workers: int = 1
+) -> EquityResult:
+    """
+    Доля банка руки игрока: полным перебором, если он обходится не
+    дороже EXACT_COST_FACTOR * n раздач методом Монте-Карло, иначе -
+    методом Монте-Карло.
+    :param seed: зерно генератора случайных чисел.
+    :param workers: количество процессов для метода Монте-Карло; при
+        workers > 1 используется parallel_monte_carlo.
+    Остальные параметры - как у monte_carlo.
+    """
+    board_size = len(table) if table else 0
+    if board_size >= 3:
+        cost = exact_cost(players_count, board_size)
+        if cost <= EXACT_COST_FACTOR * n * players_count:
+            return exact(hand, players_count, table)
+    if workers > 1:
+        return parallel_monte_carlo(
+            hand, players_count, table, n, seed, workers
+        )
+    return monte_carlo(
+        hand, players_count, table, n, np.random.default_rng(seed)
+    )
+
+
+def estimate(
+    hand: typing.Sequence[typing.Tuple[int, int]],
+    players_count: int,
+    table: typing.Sequence[typing.Tuple[int, int]] | None = None,
+    half_width: float | None = None,
+    time_limit: float | None = None,
+    confidence: float = 0.95,
+    max_samples: int = 1000000,
+    rng: np.random.Generator | None = None
+) -> EquityResult:
+    """
+    Оценка доли банка с заданной точностью и/или за заданное время.
+    Раздачи разыгрываются блоками по ADAPTIVE_BLOCK_SIZE; расчет
+    прекращается, когда полуширина доверительного интервала не больше
+    half_width, истекло time_limit секунд или разыграно max_samples раздач.
+    Если полный перебор дешевле max_samples раздач, возвращается точный
+    результат.
+    :param half_width: требуемая полуширина доверительного интервала
+        (в долях банка, например 0.005 - это ±0.5%).
+    :param time_limit: ограничение времени расчета в секундах.
+    :param confidence: уровень доверия для half_width.
+    :param max_samples: максимальное количество раздач.
+    :return: результат с оценкой, стандартной ошибкой и количеством
+        разыгранных раздач.
+    """
+    started = time.monotonic()
+    board_size = len(table) if table else 0
+    if (
+        board_size >= 3
+        and exact_cost(players_count, board_size) <= max_samples * players_count
+    ):
+        return exact(hand, players_count, table)
+    if rng is None:
+        rng = np.random.default_rng()
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    hand_codes = to_codes(hand)
+    board = to_codes(table)
+    live = live_cards(hand_codes, board)
+    result = EMPTY_RESULT
+    while result.samples < max_samples:
+        block = deal_block(
+            rng, hand_codes, board, players_count,
+            min(ADAPTIVE_BLOCK_SIZE, max_samples - result.samples), live
+        )
+        result += score_block(evaluate_block(block))
+        if result.samples < ADAPTIVE_MIN_SAMPLES:
+            continue
+        if half_width is not None and z * result.stderr <= half_width:
+            break
+        if time_limit is not None and time.monotonic() - started >= time_limit:
+            break
+    return result
+
+
+def multiway_equity(
+    hands: typing.Sequence[typing.Sequence[typing.Tuple[int, int]]],
+    table: typing.Sequence[typing.Tuple[int, int]] | None = None,
+    n: int = 20000,
+    rng: np.random.Generator | None = None
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Доли банка всех игроков, карты которых известны. Каждый вариант стола
+    разыгрывается один раз и оценивается для всех рук сразу. Если
+    вариантов добора не больше MULTIWAY_EXACT_LIMIT, перебираются все, иначе
+    разыгрываются n случайных.
+    :param hands: руки игроков (по две карты).
+    :param table: известные карты стола.
+    :param n: количество случайных вариантов стола.
+    :param rng: генератор случайных чисел NumPy.
+    :return: два массива формы (len(hands),): доля выигрышей и доля банка,
+        полученная при ничьих; их сумма - доля банка игрока.
+    """
+    hand_codes = np.stack([to_codes(hand) for hand in hands])
+    board = to_codes(table)
+    live = live_cards(hand_codes.ravel(), board)
+    missing = 5 - board.size
+    if math.comb(live.size, missing) <= MULTIWAY_EXACT_LIMIT:
+        drawn = live[np.array(
+            list(itertools.combinations(range(live.size), missing)), dtype=np.intp
+        )]
+    else:
+        drawn = sample_cards(rng or np.random.default_rng(), live, n, missing)
+    count, players_count = len(drawn), len(hands)
+    boards = np.concatenate(
+        [np.broadcast_to(board, (count, board.size)), drawn], axis=1
+    )
+    block = np.concatenate(
+        [
+            np.broadcast_to(hand_codes, (count, players_count, 2)),
+            np.broadcast_to(boards[:, None, :], (count, players_count, 5))
+        ],
+        axis=2
+    )
+    strength = evaluate_block(block)
+    winners = strength == strength.max(axis=1, keepdims=True)
+    winners_count = winners.sum(axis=1, keepdims=True)
+    wins = (winners & (winners_count == 1)).mean(axis=0)
+    ties = (winners * (winners_count > 1) / winners_count).mean(axis=0)
+    return wins, ties
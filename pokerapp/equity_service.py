@@ -0,0 +1,344 @@
+"""
+Сервис расчета вероятности выигрыша с объединением запросов.
+
+Запросы, пришедшие в течение BATCH_WINDOW секунд, объединяются в пакет:
+раздачи всех запросов пакета разыгрываются (equity.deal_block) и
+оцениваются одним вызовом evaluate_batch, после чего результаты
+разделяются по запросам (equity.score_block). Пакеты считаются в пуле
+процессов, поэтому при большом потоке запросов заняты все ядра, а
+накладные расходы на вызов делятся между запросами пакета.
+
+Протокол - JSON Lines: запрос
+    {"id": 1, "hand": [[12, 0], [11, 1]], "players": 6,
+     "table": [[10, 2], [3, 3], [0, 0]], "n": 20000}
+(карты - пары [<номинал>, <масть>], table и n необязательны), ответ
+    {"id": 1, "equity": 0.2315, "stderr": 0.0027, "samples": 20000,
+     "wins": ..., "ties": ..., "squares": ...}
+(последние поля - суммы equity.EquityResult) или {"id": 1, "error": "..."}.
+Ответы приходят по мере готовности, в порядке, который может отличаться
+от порядка запросов.
+
+Запуск:
+python equity_service.py - запросы из stdin, ответы в stdout;
+python equity_service.py --port 8765 - сервер на 127.0.0.1:8765.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import socket
+import sys
+import typing
+
+import numpy as np
+
+from equity import (
+    deal_block, DEFAULT_BLOCK_SIZE, EMPTY_RESULT, EquityResult, live_cards,
+    score_block, to_codes
+)
+from evaluator import evaluate_batch
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+
+# Время ожидания запросов для пакета в секундах.
+BATCH_WINDOW = 0.005
+# Пакет отправляется на расчет, не дожидаясь конца окна, если в нем
+# набралось столько рук (раздачи запроса, умноженные на количество
+# игроков, - столько комбинаций из 7 карт оценивает evaluate_batch).
+BATCH_HANDS = 200000
+
+DEFAULT_SAMPLES = 20000
+MAX_SAMPLES = 1000000
+MAX_PLAYERS = 10
+
+
+class Query(typing.NamedTuple):
+    hand: typing.Tuple[typing.Tuple[int, int], ...]
+    players_count: int
+    table: typing.Tuple[typing.Tuple[int, int], ...]
+    n: int
+
+
+def evaluate_queries(
+    queries: typing.Sequence[Query], seed: np.random.SeedSequence | int | None = None
+) -> typing.List[EquityResult]:
+    """
+    Разыгрывает раздачи всех запросов и оценивает их вместе: комбинации
+    всех запросов передаются в evaluate_batch одним массивом (большие
+    запросы делятся на блоки по DEFAULT_BLOCK_SIZE раздач, а массив - на
+    части по BATCH_HANDS комбинаций).
+    :return: результаты запросов в том же порядке.
+    """
+    rng = np.random.default_rng(seed)
+    results = [EMPTY_RESULT] * len(queries)
+    blocks = []
+    rows = 0
+
+    def evaluate():
+        strength = evaluate_batch(np.concatenate([block for _, block in blocks]))
+        start = 0
+        for index, block in blocks:
+            results[index] += score_block(
+                strength[start:start + len(block)].reshape(
+                    -1, queries[index].players_count
+                )
+            )
+            start += len(block)
+
+    for index, query in enumerate(queries):
+        hand = to_codes(query.hand)
+        board = to_codes(query.table)
+        live = live_cards(hand, board)
+        for start in range(0, query.n, DEFAULT_BLOCK_SIZE):
+            block = deal_block(
+                rng, hand, board, query.players_count,
+                min(DEFAULT_BLOCK_SIZE, query.n - start), live
+            ).reshape(-1, 7)
+            blocks.append((index, block))
+            rows += len(block)
+            if rows >= BATCH_HANDS:
+                evaluate()
+                blocks, rows = [], 0
+    if blocks:
+        evaluate()
+    return results
+
+
+def parse_query(request: dict) -> Query:
+    """
+    Проверяет запрос.
+    :raise ValueError: если запрос некорректен.
+    """
+    try:
+        hand = tuple((int(value), int(suit)) for value, suit in request['hand'])
+        table = tuple(
+            (int(value), int(suit)) for value, suit in request.get('table') or ()
+        )
+        players_count = int(request['players'])
+        n = int(request.get('n', DEFAULT_SAMPLES))
+    except (KeyError, TypeError, ValueError) as error:
+        raise ValueError(f'Invalid request: {error!r}')
+    cards = hand + table
+    if len(hand) != 2 or len(table) not in (0, 3, 4, 5):
+        raise ValueError('Hand must have 2 cards and table 0, 3, 4 or 5')
+    if any(not 0 <= value < 13 or not 0 <= suit < 4 for value, suit in cards):
+        raise ValueError('Invalid card')
+    if len(set(cards)) != len(cards):
+        raise ValueError('Duplicate cards')
+    if not 2 <= players_count <= MAX_PLAYERS:
+        raise ValueError(f'Players count must be from 2 to {MAX_PLAYERS}')
+    if not 1 <= n <= MAX_SAMPLES:
+        raise ValueError(f'n must be from 1 to {MAX_SAMPLES}')
+    return Query(hand, players_count, table, n)
+
+
+class EquityBatcher:
+    def __init__(
+        self,
+        executor: concurrent.futures.Executor | None = None,
+        window: float = BATCH_WINDOW,
+        max_hands: int = BATCH_HANDS,
+        seed: int | None = None
+    ) -> None:
+        """
+        :param executor: пул, в котором считаются пакеты (по умолчанию -
+            пул процессов по количеству ядер).
+        :param window: время ожидания запросов для пакета в секундах.
+        :param max_hands: количество рук (раздачи, умноженные на
+            количество игроков), при котором пакет отправляется на расчет
+            сразу.
+        :param seed: зерно, из которого порождаются потоки случайных
+            чисел пакетов.
+        """
+        self.executor = (
+            concurrent.futures.ProcessPoolExecutor(os.cpu_count())
+            if executor is None else executor
+        )
+        self.window = window
+        self.max_hands = max_hands
+        self.batches = 0
+        self.queries = 0
+        self._seeds = np.random.SeedSequence(seed)
+        self._pending = []
+        self._hands = 0
+        self._timer = None
+
+    async def submit(self, query: Query) -> EquityResult:
+        """
+        Добавляет запрос в текущий пакет и ждет его результата.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future))
+        self._hands += query.n * query.players_count
+        if self._hands >= self.max_hands:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._hands = self._pending, [], 0
+        if not batch:
+            return
+        self.batches += 1
+        self.queries += len(batch)
+        asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch: list) -> None:
+        queries = [query for query, _ in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, evaluate_queries, queries, self._seeds.spawn(1)[0]
+            )
+        except Exception as error:
+            logger.exception('Batch of %s queries failed', len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def handle(self, line: str | bytes) -> str:
+        """
+        Обрабатывает строку запроса.
+        :return: строка ответа (без перевода строки).
+        """
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('Request must be an object')
+            request_id = request.get('id')
+            result = await self.submit(parse_query(request))
+        except ValueError as error:
+            return json.dumps({'id': request_id, 'error': str(error)})
+        except Exception:
+            logger.exception('Request failed: %s', line)
+            return json.dumps({'id': request_id, 'error': 'Internal error'})
+        return json.dumps({
+            'id': request_id,
+            'equity': result.equity,
+            'stderr': result.stderr,
+            'samples': result.samples,
+            'wins': result.wins,
+            'ties': result.ties,
+            'squares': result.squares,
+        })
+
+
+async def serve_stdio(batcher: EquityBatcher) -> None:
+    """
+    Читает запросы из stdin и пишет ответы в stdout до конца ввода.
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+    )
+
+    async def answer(line):
+        sys.stdout.write(await batcher.handle(line) + '\n')
+        sys.stdout.flush()
+
+    tasks = set()
+    while line := await reader.readline():
+        if line.strip():
+            task = asyncio.create_task(answer(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks)
+
+
+async def serve_socket(
+    batcher: EquityBatcher, host: str = '127.0.0.1', port: int = DEFAULT_PORT
+) -> None:
+    """
+    Сервер: каждое соединение может отправлять запросы, не дожидаясь
+    ответов на предыдущие.
+    """
+    async def client(reader, writer):
+        tasks = set()
+
+        async def answer(line):
+            writer.write((await batcher.handle(line) + '\n').encode())
+            await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(answer(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(client, host, port)
+    logger.info('Equity service on %s:%s', host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def request_equity(
+    hand: typing.Sequence[typing.Tuple[int, int]],
+    players_count: int,
+    table: typing.Sequence[typing.Tuple[int, int]] | None = None,
+    n: int = DEFAULT_SAMPLES,
+    host: str = '127.0.0.1',
+    port: int = DEFAULT_PORT,
+    timeout: float | None = 60
+) -> EquityResult:
+    """
+    Синхронный клиент: отправляет один запрос сервису и ждет ответа.
+    :raise ValueError: если сервис вернул ошибку.
+    """
+    request = {
+        'hand': [list(card) for card in hand],
+        'players': players_count,
+        'table': [list(card) for card in table or ()],
+        'n': n,
+    }
+    with socket.create_connection((host, port), timeout) as connection:
+        connection.sendall((json.dumps(request) + '\n').encode())
+        with connection.makefile('r') as stream:
+            response = json.loads(stream.readline())
+    if 'error' in response:
+        raise ValueError(response['error'])
+    return EquityResult(
+        response['samples'], response['wins'], response['ties'],
+        response['squares']
+    )
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    parser = argparse.ArgumentParser(description='Сервис расчета вероятности выигрыша.')
+    parser.add_argument('--port', type=int, help='порт (без него - stdin/stdout)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--window', type=float, default=BATCH_WINDOW)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    batcher = EquityBatcher(
+        concurrent.futures.ProcessPoolExecutor(args.workers),
+        args.window, seed=args.seed
+    )
+    if args.port is None:
+        asyncio.run(serve_stdio(batcher))
+    else:
+        asyncio.run(serve_socket(batcher, args.host, args.port))
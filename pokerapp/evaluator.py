@@ -0,0 +1,328 @@
+"""
+Табличный оценщик силы комбинации из 2-7 карт.
+
+Карта кодируется целым числом code = value * 4 + suit (0..51).
+Сила комбинации - одно целое число, упакованное по полубайтам:
+    <категория> <r1> <r2> <r3> <r4> <r5>,
+где категория - число от 0 (старшая карта) до 8 (стрит-флаш), а r1..r5 -
+значимые номиналы комбинации в порядке убывания значимости, записанные как
+value + 1 (0 - номинал отсутствует). Для стрита хранится только старшая
+карта, для младшего стрита (A2345) - пятерка.
+
+Оценка сводится к сумме ключей карт и поиску в заранее построенных
+таблицах: ключ по номиналам - это число в пятеричной системе (количество
+карт каждого номинала), ключ по мастям - в восьмеричной. Если флаша нет,
+сила берется из таблицы по ключу номиналов, иначе - из таблицы по битовой
+маске номиналов флашевой масти.
+
+Для массовой оценки предназначена функция evaluate_batch: она принимает
+массив кодов карт формы (N, 7) и считает силу всех N комбинаций
+векторными операциями NumPy над битовыми масками номиналов по мастям, без
+цикла по отдельным комбинациям.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+HIGH_CARD = 0
+PAIR = 1
+TWO_PAIRS = 2
+TRIPLE = 3
+STRAIGHT = 4
+FLUSH = 5
+FULL_HOUSE = 6
+CARRE = 7
+STRAIGHT_FLUSH = 8
+
+CATEGORY_SHIFT = 20
+
+_SUIT_SHIFT = 31
+_RANK_KEY_MASK = (1 << _SUIT_SHIFT) - 1
+
+# Ключ карты: младшие 31 бит - 5 ** value, старшие - 8 ** suit.
+CARD_KEY = [
+    5 ** (code >> 2) + (1 << (3 * (code & 3)) << _SUIT_SHIFT)
+    for code in range(52)
+]
+_VALUE_SUIT_KEY = [
+    [CARD_KEY[value * 4 + suit] for suit in range(4)] for value in range(13)
+]
+RANK_BIT = [1 << (code >> 2) for code in range(52)]
+
+
+def card_code(card: Tuple[int, int]) -> int:
+    """
+    Переводит карту-кортеж (<номинал>, <масть>) в целочисленный код.
+    """
+    return card[0] * 4 + card[1]
+
+
+def code_to_card(code: int) -> Tuple[int, int]:
+    """
+    Переводит целочисленный код карты в кортеж (<номинал>, <масть>).
+    """
+    return code >> 2, code & 3
+
+
+def _pack(category: int, ranks: Sequence[int]) -> int:
+    strength = category
+    for i in range(5):
+        strength = (strength << 4) | (ranks[i] + 1 if i < len(ranks) else 0)
+    return strength
+
+
+def _straight_top(mask: int) -> int:
+    """
+    Номинал старшей карты стрита в битовой маске номиналов, либо -1.
+    Туз (бит 12) учитывается также и как младшая карта.
+    """
+    extended = (mask << 1) | ((mask >> 12) & 1)
+    for top in range(13, 3, -1):
+        if (extended >> (top - 4)) & 0b11111 == 0b11111:
+            return top - 1
+    return -1
+
+
+def _descending(mask: int) -> List[int]:
+    return [value for value in range(12, -1, -1) if mask >> value & 1]
+
+
+def _strength_from_counts(counts: Sequence[int]) -> int:
+    """
+    Сила комбинации без учета мастей по количеству карт каждого номинала.
+    """
+    groups = {1: [], 2: [], 3: [], 4: []}
+    mask = 0
+    for value in range(12, -1, -1):
+        if counts[value]:
+            groups[counts[value]].append(value)
+            mask |= 1 << value
+    quads, trips, pairs = groups[4], groups[3], groups[2]
+    if quads:
+        return _pack(CARRE, [quads[0]] + _descending(mask & ~(1 << quads[0]))[:1])
+    if trips and (len(trips) > 1 or pairs):
+        return _pack(FULL_HOUSE, [trips[0], max(trips[1:] + pairs)])
+    straight_top = _straight_top(mask)
+    if straight_top >= 0:
+        return _pack(STRAIGHT, [straight_top])
+    if trips:
+        return _pack(TRIPLE, [trips[0]] + _descending(mask & ~(1 << trips[0]))[:2])
+    if len(pairs) > 1:
+        rest = mask & ~(1 << pairs[0]) & ~(1 << pairs[1])
+        return _pack(TWO_PAIRS, pairs[:2] + _descending(rest)[:1])
+    if pairs:
+        return _pack(PAIR, [pairs[0]] + _descending(mask & ~(1 << pairs[0]))[:3])
+    return _pack(HIGH_CARD, _descending(mask)[:5])
+
+
+def _flush_strength(mask: int) -> int:
+    straight_top = _straight_top(mask)
+    if straight_top >= 0:
+        return _pack(STRAIGHT_FLUSH, [straight_top])
+    return _pack(FLUSH, _descending(mask)[:5])
+
+
+def _build_rank_table() -> Dict[int, int]:
+    """
+    Перебирает все наборы из не более чем 7 номиналов (не более 4 карт
+    каждого номинала) и сопоставляет их ключу силу комбинации.
+    """
+    table = {}
+    counts = [0] * 13
+
+    def _fill(value: int, left: int, key: int) -> None:
+        if value == 13:
+            table[key] = _strength_from_counts(counts)
+            return
+        for count in range(min(4, left) + 1):
+            counts[value] = count
+            _fill(value + 1, left - count, key + count * 5 ** value)
+        counts[value] = 0
+
+    _fill(0, 7, 0)
+    return table
+
+
+def _build_flush_suit_table() -> List[int]:
+    table = [-1] * (1 << 12)
+    for key in range(1 << 12):
+        for suit in range(4):
+            if (key >> (3 * suit)) & 7 >= 5:
+                table[key] = suit
+    return table
+
+
+RANK_TABLE = _build_rank_table()
+FLUSH_SUIT = _build_flush_suit_table()
+FLUSH_TABLE = [
+    _flush_strength(mask) if bin(mask).count('1') >= 5 else 0
+    for mask in range(1 << 13)
+]
+
+
+_FLUSH_TABLE_NP = np.array(FLUSH_TABLE, dtype=np.int32)
+# Упакованные по полубайтам пять старших номиналов маски.
+_TOP_RANKS_NP = np.array(
+    [_pack(HIGH_CARD, _descending(mask)[:5]) for mask in range(1 << 13)],
+    dtype=np.int32
+)
+# Старший номинал маски (value + 1), либо 0 для пустой маски.
+_HIGHEST_NP = _TOP_RANKS_NP >> 16
+# Бит номинала по его полубайту (value + 1); для 0 - пустая маска.
+_NIBBLE_BIT_NP = np.array([0] + [1 << value for value in range(13)], dtype=np.int32)
+# Старшая карта стрита в маске номиналов (value + 1), либо 0.
+_STRAIGHT_TOP_NP = np.array(
+    [_straight_top(mask) + 1 for mask in range(1 << 13)], dtype=np.int32
+)
+# Бит карты в 52-битной маске руки: масть * 13 + номинал.
+_CARD_BIT_NP = np.array(
+    [1 << ((code & 3) * 13 + (code >> 2)) for code in range(52)],
+    dtype=np.int64
+)
+
+
+def evaluate(codes: Sequence[int]) -> int:
+    """
+    Сила старшей комбинации из 5 карт для набора из 2-7 карт.
+    :param codes: коды карт (value * 4 + suit).
+    :return: целое число - чем больше, тем сильнее комбинация.
+    """
+    key = 0
+    for code in codes:
+        key += CARD_KEY[code]
+    suit = FLUSH_SUIT[key >> _SUIT_SHIFT]
+    if suit < 0:
+        return RANK_TABLE[key & _RANK_KEY_MASK]
+    mask = 0
+    for code in codes:
+        if code & 3 == suit:
+            mask |= RANK_BIT[code]
+    return FLUSH_TABLE[mask]
+
+
+def evaluate_cards(cards: Sequence[Tuple[int, int]]) -> int:
+    """
+    То же, что evaluate, но для карт-кортежей (<номинал>, <масть>).
+    """
+    key = 0
+    for value, suit in cards:
+        key += _VALUE_SUIT_KEY[value][suit]
+    suit = FLUSH_SUIT[key >> _SUIT_SHIFT]
+    if suit < 0:
+        return RANK_TABLE[key & _RANK_KEY_MASK]
+    mask = 0
+    for value, card_suit in cards:
+        if card_suit == suit:
+            mask |= 1 << value
+    return FLUSH_TABLE[mask]
+
+
+def category(strength: int) -> int:
+    """
+    Категория комбинации (0 - старшая карта, ..., 8 - стрит-флаш).
+    """
+    return strength >> CATEGORY_SHIFT
+
+
+def decode(strength: int) -> Tuple[int, List[int]]:
+    """
+    Раскладывает силу комбинации на категорию и список значимых номиналов
+    в порядке убывания значимости.
+    """
+    ranks = []
+    for shift in range(16, -1, -4):
+        nibble = (strength >> shift) & 15
+        if nibble:
+            ranks.append(nibble - 1)
+    return strength >> CATEGORY_SHIFT, ranks
+
+
+def evaluate_batch(codes: np.ndarray) -> np.ndarray:
+    """
+    Векторная оценка силы множества комбинаций.
+    Для каждой руки строятся маски номиналов по мастям; поразрядное
+    сложение четырех масок дает маски номиналов, встречающихся ровно 1, 2,
+    3 и 4 раза (гистограмма номиналов в битовом виде), а дальше все
+    категории определяются поиском в таблицах по 13-битным маскам.
+    :param codes: целочисленный массив формы (N, k), 5 <= k <= 7, коды карт
+        (value * 4 + suit).
+    :return: массив формы (N,) - сила каждой комбинации, совпадающая с
+        результатом evaluate.
+    """
+    return evaluate_masks(
+        np.bitwise_or.reduce(_CARD_BIT_NP[np.asarray(codes)], axis=1)
+    )
+
+
+def evaluate_masks(hand_mask: np.ndarray) -> np.ndarray:
+    """
+    Векторная оценка силы комбинаций, заданных 52-битными масками карт
+    (бит suit * 13 + value, см. cardset.CardSet).
+    :param hand_mask: целочисленный массив формы (N,) - маски из 5-7 карт.
+    :return: массив формы (N,) - сила каждой комбинации.
+    """
+    hand_mask = np.asarray(hand_mask, dtype=np.int64)
+    suit_masks = [
+        ((hand_mask >> (13 * suit)) & 0x1FFF).astype(np.int32)
+        for suit in range(4)
+    ]
+    # Поразрядный сумматор количества карт каждого номинала.
+    low_xor = suit_masks[0] ^ suit_masks[1]
+    low_and = suit_masks[0] & suit_masks[1]
+    high_xor = suit_masks[2] ^ suit_masks[3]
+    high_and = suit_masks[2] & suit_masks[3]
+    odd = low_xor ^ high_xor
+    two = low_and ^ high_and ^ (low_xor & high_xor)
+    quads = low_and & high_and
+    trips = odd & two
+    pairs = two & ~odd
+    ranks = suit_masks[0] | suit_masks[1] | suit_masks[2] | suit_masks[3]
+
+    quad = _HIGHEST_NP[quads]
+    trip = _HIGHEST_NP[trips]
+    high_pair = _HIGHEST_NP[pairs]
+    low_pair = _HIGHEST_NP[pairs & ~_NIBBLE_BIT_NP[high_pair]]
+    full_house_pair = _HIGHEST_NP[(trips & ~_NIBBLE_BIT_NP[trip]) | pairs]
+    straight_top = _STRAIGHT_TOP_NP[ranks]
+    # В таблице флашей для масок меньше чем из 5 карт записан 0.
+    flush = np.maximum(
+        np.maximum(_FLUSH_TABLE_NP[suit_masks[0]], _FLUSH_TABLE_NP[suit_masks[1]]),
+        np.maximum(_FLUSH_TABLE_NP[suit_masks[2]], _FLUSH_TABLE_NP[suit_masks[3]])
+    )
+
+    return np.select(
+        [
+            quad > 0,
+            (trip > 0) & (full_house_pair > 0),
+            flush > 0,
+            straight_top > 0,
+            trip > 0,
+            low_pair > 0,
+            high_pair > 0,
+        ],
+        [
+            (
+                (CARRE << CATEGORY_SHIFT) | quad << 16
+                | (_HIGHEST_NP[ranks & ~_NIBBLE_BIT_NP[quad]]) << 12
+            ),
+            (FULL_HOUSE << CATEGORY_SHIFT) | trip << 16 | full_house_pair << 12,
+            flush,
+            (STRAIGHT << CATEGORY_SHIFT) | straight_top << 16,
+            (
+                (TRIPLE << CATEGORY_SHIFT) | trip << 16
+                | (_TOP_RANKS_NP[ranks & ~_NIBBLE_BIT_NP[trip]] >> 12) << 8
+            ),
+            (
+                (TWO_PAIRS << CATEGORY_SHIFT) | high_pair << 16 | low_pair << 12
+                | _HIGHEST_NP[
+                    ranks & ~_NIBBLE_BIT_NP[high_pair] & ~_NIBBLE_BIT_NP[low_pair]
+                ] << 8
+            ),
+            (
+                (PAIR << CATEGORY_SHIFT) | high_pair << 16
+                | (_TOP_RANKS_NP[ranks & ~_NIBBLE_BIT_NP[high_pair]] >> 8) << 4
+            ),
+        ],
+        default=_TOP_RANKS_NP[ranks]
+    )
@@ -1,13 +1,16 @@
 import logging
-import logging.config
+import math
 import random
 import typing
 
 import actions
-from actions import ACTIONS
-from cards import _generate_deck, _calculate_max_value, Card, Cards
-from config import LOGGING_CONFIG
+from cards import _calculate_max_value, Card, Cards, Deck
+from config import HISTORY_FILENAME, setup_logging
+from equity import multiway_equity
+from evaluator import card_code
 import game_stage
+import history
+from history import HandHistoryWriter
 from exceptions import ExceededValueError, InsufficientRaiseError, MinRaiseError
 from player import Player
 import player_status
@@ -45,20 +48,46 @@ class Deal:
         ограничение на количество торгов в рамках одного раунда раздачи.
     :bot_limit: максимальное количество активного повышения ставки в игре
         для игрока-бота.
+    :headless: раздача без вывода в консоль - для симуляций, в которых
+        все игроки управляются ботами (см. модуль providers).
+    :track_p_win: пересчитывать ли вероятности выигрыша игроков на каждой
+        улице; по умолчанию - только не в режиме headless.
+    :history: запись истории раздачи (см. модуль history); game_id и
+        deal_id - номера игры и раздачи в записях.
+    :deck: колода (см. cards.Deck); перед раздачей в нее возвращаются все
+        карты, поэтому одну колоду можно использовать для многих раздач.
     """
 
-    def __new__(
-        cls,
+    def __init__(
+        self,
         players: typing.List[Player],
         small_blind_rate: int,
         raise_personal_limit: int | None = None,
-        trade_rounds_limit: int | None = None
-    ):
-        self = object.__new__(cls)
-        deck = _generate_deck()
+        trade_rounds_limit: int | None = None,
+        headless: bool = False,
+        track_p_win: bool | None = None,
+        history: HandHistoryWriter | None = None,
+        game_id: int = 0,
+        deal_id: int = 0,
+        deck: Deck | None = None
+    ) -> None:
+        """
+        Создает раздачу: раздает карты игрокам и принимает обязательные
+        ставки. Сама раздача разыгрывается методами step (одна улица) или
+        play (до конца).
+        """
+        self.headless = headless
+        self.history = history
+        self.game_id = game_id
+        self.deal_id = deal_id
+        self.track_p_win = not headless if track_p_win is None else track_p_win
+        if deck is None:
+            deck = Deck()
+        deck.shuffle()
         self.bank = 0
         self.current_bid = 0
         self.players = players
+        self.seats = {player: seat for seat, player in enumerate(players)}
 
         self.raise_personal_limit = raise_personal_limit
         self.trade_rounds_limit = trade_rounds_limit
@@ -85,49 +114,119 @@ class Deal:
         cards_to_hands = {player: [] for player in range(players_count)}
         for _ in range(2):
             for player in range(players_count):
-                cards_to_hands[player].append(deck.pop(0))
+                cards_to_hands[player].append(deck.pop())
         self._deck = deck
         self.p_win = {}
-        logging.info(f'Stage: {game_stage.STAGE[self.stage]}')
+        logger.info('Stage: %s', game_stage.STAGE[self.stage])
         for player_order, player in enumerate(self.players):
             player.give_hand(two_cards=tuple(cards_to_hands[player_order]))
-            self.p_win[player] = player.p_win(self)
-            logging.info(
-                f'Player{player_order} {player.name}: wealth: {player.wealth}, '
-                f'status: {player.STATUS[player.status]}, '
-                f'hand: {Card(*player.hand[0])} {Card(*player.hand[1])}, '
-                f'role: {player.role}, %win: {self.p_win[player]}%'
-            )
+        self._hand_codes = [
+            (card_code(player.hand[0]), card_code(player.hand[1]))
+            for player in self.players
+        ]
+        self._table_codes = ()
+        self.update_p_win()
+        self.record_cards()
 
         # Обязательные ставки
         self.blind = small_blind_rate * 2
         self.players[0].action(
             self, act=actions.BLIND, value=small_blind_rate
         )
-        logging.info(
-            f'Player {players[0].name}: order: 0, wealth: {players[0].wealth}, '
-            f'hand: {Card(*players[0].hand[0])} {Card(*players[0].hand[1])}, '
-            f'role: {players[0].role}, %win: {self.p_win[self.players[0]]}%, '
-            f'action: SMALL BLIND, bid: {players[0].current_bid}, '
-            f'wealth change: {players[0].wealth_change}'
-        )
-        logging.info(f'Bank: {self.bank}, current bid: {self.current_bid}')
+        self.record(self.players[0], actions.BLIND)
 
         self.players[1].action(self, act=actions.BLIND, value=self.blind)
-        logging.info(
-            f'Player {players[1].name}: order: 1, wealth: {players[1].wealth}, '
-            f'hand: {Card(*players[1].hand[0])} {Card(*players[1].hand[1])}, '
-            f'role: {players[1].role}, %win: {self.p_win[self.players[1]]}%,  '
-            f'action: BIG BLIND, bid: {players[1].current_bid}, '
-            f'wealth change: {players[1].wealth_change}'
-        )
-        logging.info(f'Bank: {self.bank}, current bid: {self.current_bid}')
-        # Начало торгов
+        self.record(self.players[1], actions.BLIND)
         self.trade_round = 0
-        self.pre_flop()
         self.winner = None
+        self.showdown = False
+        self.is_over = False
+        self._street = 0
+
+    def step(self) -> bool:
+        """
+        Разыгрывает очередную улицу. Если после нее в раздаче остался один
+        игрок или сыграна последняя улица, распределяет банк.
+        :return: True, если раздача продолжается.
+        """
+        if self.is_over:
+            return False
+        streets = (
+            self.pre_flop, self.show_flop, self.show_turn, self.show_river
+        )
+        streets[self._street]()
+        self._street += 1
+        if self.players_in_count <= 1 or self._street == len(streets):
+            self.define_winner()
+            self.is_over = True
+        return not self.is_over
+
+    def play(self) -> 'Deal':
+        """
+        Разыгрывает раздачу до конца.
+        """
+        while self.step():
+            pass
         return self
 
+    def update_p_win(self) -> None:
+        """
+        Пересчитывает вероятности выигрыша всех не сбросивших карты
+        игроков за один проход: каждый вариант стола оценивается сразу для
+        всех рук (см. equity.multiway_equity).
+        """
+        if not self.track_p_win:
+            return
+        players = [
+            player for player in self.players
+            if player.status != player_status.FOLD
+        ]
+        wins, ties = multiway_equity(
+            [player.hand for player in players], self.table
+        )
+        for player, win, tie in zip(players, wins.tolist(), ties.tolist()):
+            self.p_win[player] = (win + tie) * 100
+
+    def record(
+        self, player: Player, action: str | int, amount: int | None = None
+    ) -> None:
+        """
+        Записывает событие раздачи в историю (см. модуль history), если она
+        ведется.
+        :param player: объект игрока
+        :param action: действие (см. модуль actions) или событие из модуля
+            history.
+        :param amount: по умолчанию - текущая ставка игрока.
+        """
+        if self.history is None:
+            return
+        if len(self._table_codes) != len(self.table):
+            self._table_codes = tuple(card_code(card) for card in self.table)
+        seat = self.seats[player]
+        p_win = self.p_win.get(player)
+        self.history.write(
+            self.game_id, self.deal_id, self.stage, seat, int(action),
+            self._hand_codes[seat] + self._table_codes,
+            math.nan if p_win is None else p_win / 100,
+            player.current_bid if amount is None else amount,
+            player.wealth, self.bank
+        )
+
+    def record_cards(self) -> None:
+        """
+        Записывает в историю карты не сбросивших карты игроков на текущей
+        улице. После пре-флопа записи нужны только ради вероятностей
+        выигрыша (карты стола есть в записях действий), поэтому без их
+        расчета не пишутся.
+        """
+        if self.history is None or (
+            self.stage != game_stage.PRE_FLOP and not self.track_p_win
+        ):
+            return
+        for player in self.players:
+            if player.status != player_status.FOLD:
+                self.record(player, history.CARDS)
+
     def current_stats(self, player: Player):
         """
         Текущая ставка в игре; текущая ставка игрока; количество игроков, с
@@ -136,23 +235,11 @@ class Deal:
         """
         pass
 
-    def action_query(self, player: Player) -> None:
+    def allowed_actions(self, player: Player) -> typing.List[str]:
         """
-        Запрос к игроку-пользователю (не боту) на действие.
-        Функция
+        Действия, доступные игроку на текущем ходе.
         :param player: объект игрока
         """
-        # TODO: Переделать input на ТГ-бота
-        # actions = {'0': 'FOLD', '1': 'CHECK', '2': 'CALL',
-        #            '3': 'RAISE', '4': 'ALL-IN'}
-        msg = ('Текущая ставка: {}; Ваша текущая ставка: {}; blind: {}.\n'
-               'Ваш ход (')
-        action = actions.FOLD
-        is_valid = False
-
-        # TODO: Переделать после тестов
-        print(player.info(self))
-
         # Отпределяем ситуацию (fold доступен всегда):
         # 1. Доступен только all-in - у игрока фишек <= текущая ставка в
         # игре, текущая ставка игрока ниже текущей ставки в игре
@@ -249,76 +336,67 @@ class Deal:
                 allow_actions = [
                     actions.FOLD, actions.CHECK, actions.RAISE, actions.ALL_IN
                 ]
-        msg += ', '.join(
-            [act + ' - ' + ACTIONS[act] for act in allow_actions]
-        )
-        msg += '): '
-        while not is_valid:
-            action = input(msg.format(
-                self.current_bid,
-                player.current_bid,
-                self.blind
-            ))
-            if action not in allow_actions:
-                print('Введите число - один из предложенных варианов.')
-            else:
-                is_valid = True
-        is_valid = False
+        if self.players_in_count <= 1:
+            # последнему не сбросившему карты игроку сбрасывать незачем:
+            # банк и так достается ему
+            allow_actions.remove(actions.FOLD)
+        return allow_actions
 
-        # При повышении ставки (raise) ввод нового значения и проверка его
+    def action_query(self, player: Player) -> None:
+        """
+        Запрос действия у источника решений игрока (см. модуль providers)
+        и его выполнение.
+        :param player: объект игрока
+        """
+        provider = player.provider
+        allow_actions = self.allowed_actions(player)
+        action = provider.choose_action(self, player, allow_actions)
+        if action not in allow_actions:
+            raise ValueError(
+                f'{player.name}: action {action} is not allowed'
+            )
+
+        # При повышении ставки (raise) запрос нового значения и проверка его
         # корректности:
         if action == actions.RAISE:
-            while not is_valid:
-                second_richest_player_wealth = sorted(
-                    [plyr for plyr in self.players
-                     if plyr.status == player_status.ACTIVE],
-                    reverse=True, key=lambda x: x.wealth
-                )[1].wealth
-                bid = int(input(
-                    f'Введите свою ставку (целое число от {min(self.current_bid + self.blind, player.wealth)}'
-                    f' до {min(player.wealth, second_richest_player_wealth)}): '
-                ))
+            second_richest_player_wealth = sorted(
+                [plyr for plyr in self.players
+                 if plyr.status == player_status.ACTIVE],
+                reverse=True, key=lambda x: x.wealth
+            )[1].wealth
+            min_bid = min(self.current_bid + self.blind, player.wealth)
+            max_bid = min(player.wealth, second_richest_player_wealth)
+            while True:
+                bid = provider.choose_raise(self, player, min_bid, max_bid)
                 try:
                     player.action(self, action, bid)
-                    logging.info(
-                        f'Player {player.name}: order: {self.players.index(player)}, wealth: {player.wealth}, '
-                        f'hand: {Card(*player.hand[0])} {Card(*player.hand[1])}, '
-                        f'role: {player.role}, %win: {self.p_win[player]}%, '
-                        f'action: RISE, bid: {player.current_bid}, '
-                        f'wealth change: {player.wealth_change}'
-                    )
-                    logging.info(f'Bank: {self.bank}, current bid: {self.current_bid}')
-                    is_valid = True
-                except ExceededValueError:
-                    print('У Вас нет столько фишек.')
-                except MinRaiseError:
-                    print('Минимальное повышение равно blind.')
-                except InsufficientRaiseError:
-                    print('Ставка должна быть выше текущей ставки в игре.')
-                except Exception as err:
-                    print('Что-то пошло не так, попробуйте еще раз.\n', err)
+                    break
+                except (
+                    ExceededValueError, MinRaiseError, InsufficientRaiseError
+                ) as error:
+                    provider.reject_raise(player, error)
         else:
             player.action(self, action)
-            logging.info(
-                f'Player {player.name}: order: {self.players.index(player)}, wealth: {player.wealth}, '
-                f'hand: {Card(*player.hand[0])} {Card(*player.hand[1])}, '
-                f'role: {player.role}, %win: {self.p_win[player]}%, '
-                f'action: {ACTIONS[action]}, bid: {player.current_bid}, '
-                f'wealth change: {player.wealth_change}'
-            )
-            logging.info(f'Bank: {self.bank}, current bid: {self.current_bid}')
-            if action == actions.FOLD:
-                self.folds_count += 1
-                self.players_in_count -= 1
-                self.active_players_count -= 1
-                for player in self.players:
-                    if player.status != player_status.FOLD:
-                        self.p_win[player] = player.p_win(self)
+        self.record(player, action)
+        if action == actions.FOLD:
+            self.folds_count += 1
+            self.players_in_count -= 1
+            self.active_players_count -= 1
+            self.update_p_win()
 
     def first_trading(self, players: typing.List[Player]) -> bool:
+        """
+        Первый круг торгов: каждый активный игрок делает ход.
+        :return: True, если торги завершены (ставки уравнены или в раздаче
+            остался один игрок).
+        """
         for player in players:
+            if self.players_in_count <= 1:
+                return True
             if player.status == player_status.ACTIVE:
                 self.action_query(player)
+        if self.players_in_count <= 1:
+            return True
         bids = set(
             [player.current_bid for player in self.players
              if player.status == player_status.ACTIVE]
@@ -332,27 +410,26 @@ class Deal:
         active_players_bids = [player.current_bid for player in active_players]
 
         player_index = 0
-        while self.active_players_count > 0:
+        while (
+            self.active_players_count > 0 and active_players
+            and self.players_in_count > 1
+        ):
             player = active_players[player_index]
             self.action_query(player)
             if player.status != player_status.ACTIVE:
                 active_players.pop(player_index)
                 active_players_bids.pop(player_index)
-                if (
-                    len(set(active_players_bids)) == 1
-                    and active_players_bids[0] == self.current_bid
-                ):
-                    break
             else:
                 active_players_bids[player_index] = player.current_bid
-                if (
-                    len(set(active_players_bids)) == 1
-                    and active_players_bids[0] == self.current_bid
-                ):
-                    break
                 player_index += 1
-                if player_index == self.active_players_count:
-                    player_index = 0
+            if (
+                not active_players_bids
+                or len(set(active_players_bids)) == 1
+                and active_players_bids[0] == self.current_bid
+            ):
+                break
+            if player_index >= len(active_players):
+                player_index = 0
 
     def pre_flop(self):
         """
@@ -369,191 +446,110 @@ class Deal:
         is_over = self.first_trading(players)
         if not is_over:
             self.trading(players)
-        if self.active_players_count <= 1 and self.all_in_players_count == 0:
-            self.define_winner()
-        else:
-            self.show_flop()
 
     def show_flop(self):
         self.stage = game_stage.FLOP
-        logging.info(f'Stage: {game_stage.STAGE[self.stage]}')
-        self._deck.pop(0)
-        for _ in range(3):
-            self.table.append(self._deck.pop(0))
-        logging.info(
-            f'Table: {" ".join([str(Card(*card)) for card in self.table])}'
-        )
-        for player_order, player in enumerate(self.players):
-            if player.status != player_status.FOLD:
-                self.p_win[player] = player.p_win(self)
-                logging.info(
-                    f'Player{player_order} {player.name}: wealth: {player.wealth}, '
-                    f'status: {player.STATUS[player.status]}, '
-                    f'hand: {Card(*player.hand[0])} {Card(*player.hand[1])}, '
-                    f'role: {player.role}, %win: {self.p_win[player]}%'
-                )
+        logger.info('Stage: %s', game_stage.STAGE[self.stage])
+        self._deck.pop()
+        self.table.extend(self._deck.draw(3))
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                'Table: %s', ' '.join([str(Card(*card)) for card in self.table])
+            )
+        self.update_p_win()
+        self.record_cards()
         self.show_table()
-        is_over = self.first_trading(self.players)
-        if not is_over:
-            self.trading(self.players)
-        if self.active_players_count <= 1:
-            self.define_winner()
-        else:
-            self.show_turn()
+        self.street_trading()
 
     def show_turn(self):
         self.stage = game_stage.TURN
-        logging.info(f'Stage: {game_stage.STAGE[self.stage]}')
-        self._deck.pop(0)
-        self.table.append(self._deck.pop(0))
-        logging.info(
-            f'Table: {" ".join([str(Card(*card)) for card in self.table])}'
-        )
-        for player_order, player in enumerate(self.players):
-            if player.status != player_status.FOLD:
-                self.p_win[player] = player.p_win(self)
-                logging.info(
-                    f'Player{player_order} {player.name}: wealth: {player.wealth}, '
-                    f'status: {player.STATUS[player.status]}, '
-                    f'hand: {Card(*player.hand[0])} {Card(*player.hand[1])}, '
-                    f'role: {player.role}, %win: {self.p_win[player]}%'
-                )
+        logger.info('Stage: %s', game_stage.STAGE[self.stage])
+        self._deck.pop()
+        self.table.append(self._deck.pop())
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                'Table: %s', ' '.join([str(Card(*card)) for card in self.table])
+            )
+        self.update_p_win()
+        self.record_cards()
         self.show_table()
-        is_over = self.first_trading(self.players)
-        if not is_over:
-            self.trading(self.players)
-        if self.active_players_count <= 1:
-            self.define_winner()
-        else:
-            self.show_river()
+        self.street_trading()
 
     def show_river(self):
         self.stage = game_stage.RIVER
-        logging.info(f'Stage: {game_stage.STAGE[self.stage]}')
-        self._deck.pop(0)
-        self.table.append(self._deck.pop(0))
-        logging.info(
-            f'Table: {" ".join([str(Card(*card)) for card in self.table])}'
-        )
-        for player_order, player in enumerate(self.players):
-            if player.status != player_status.FOLD:
-                self.p_win[player] = player.p_win(self)
-                logging.info(
-                    f'Player{player_order} {player.name}: wealth: {player.wealth}, '
-                    f'status: {player.STATUS[player.status]}, '
-                    f'hand: {Card(*player.hand[0])} {Card(*player.hand[1])}, '
-                    f'role: {player.role}, %win: {self.p_win[player]}%'
-                )
+        logger.info('Stage: %s', game_stage.STAGE[self.stage])
+        self._deck.pop()
+        self.table.append(self._deck.pop())
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                'Table: %s', ' '.join([str(Card(*card)) for card in self.table])
+            )
+        self.update_p_win()
+        self.record_cards()
         self.show_table()
+        self.street_trading()
+
+    def street_trading(self):
+        """
+        Торги после открытия карт стола. Если торговаться могут меньше двух
+        игроков (остальные сбросили карты или пошли ва-банк), торги не
+        проводятся.
+        """
+        if self.active_players_count <= 1:
+            return
         is_over = self.first_trading(self.players)
         if not is_over:
             self.trading(self.players)
-        self.define_winner()
 
     def show_table(self):
+        if self.headless:
+            return
         print('Table:', Cards([Card(*card) for card in self.table]), sep='\n')
 
     def define_winner(self):
-        deal_players = self.players
-
-        def _define_winner(deal, players):
-            # Если в игре остался один игрок - он победитель.
-            if deal.players_in_count == 1:
-                for player in players:
-                    if player.status != player_status.FOLD:
-                        player.wealth_change += deal.bank
-                        break
-            else:
-                # Расположим игроков в порядке убывания комбинации,
-                # при равенстве - в порядке возрастания ставки.
-                queue = sorted(
-                    [
-                        (player, player.combination(deal)) for player
-                        in players if player.status != player_status.FOLD
-                    ],
-                    key=lambda x: (x[1], -x[0].current_bid), reverse=True
-                )
-
-                # Простой случай - один победитель забирает весь банк.
-                if queue[0][0].current_bid == deal.current_bid:
-
-                    # Простой случай - один победитель забирает весь банк.
-                    if queue[0][1] > queue[1][1]:
-                        queue[0][0].wealth_change += deal.bank
-
-                    # Ничья - банк делится поровну между несколькими победителями.
-                    else:
-                        winners_count = 2
-                        while (
-                            winners_count < len(queue)
-                            and queue[winners_count-1][1] == queue[winners_count][1]
-                        ):
-                            winners_count += 1
-                        for player_index in range(winners_count):
-                            queue[player_index][0].wealth_change += deal.bank // winners_count
-
-                # Победивший игрок претендует не на весь банк
-                elif queue[0][1] > queue[1][1]:
-                    new_player_list = []
-                    for player in (
-                        queue[1:]
-                        + [(player,) for player in players
-                           if player.status == player_status.FOLD]
-                    ):
-                        bid = min(
-                            queue[0][0].current_bid,
-                            player[0].current_bid
-                        )
-                        queue[0][0].wealth_change += bid
-                        deal.bank -= bid
-                        player[0].current_bid -= bid
-                        if player[0].current_bid > 0:
-                            new_player_list.append(player[0])
-
-                    _define_winner(deal, new_player_list)
-
-                # Ничья, и часть игроков не претендовали на весь банк
-                else:
-                    winners_count = 2
-                    while (
-                        winners_count < len(queue)
-                        and queue[winners_count - 1][1] == queue[winners_count][1]
-                    ):
-                        winners_count += 1
-                    for player_index in range(winners_count):
-
-                        for winner in queue[player_index:winners_count]:
-                            winner[0].wealth_change += queue[player_index][0].current_bid
-                            winner[0].current_bid -= queue[player_index][0].current_bid
-                            deal.bank -= queue[player_index][0].current_bid
-
-                        for loser in (
-                            queue[winners_count:]
-                            + [(player,) for player in players
-                               if player.status == player_status.FOLD]
-                        ):
-                            if loser[0].current_bid > 0:
-                                bid = min(
-                                    queue[player_index][0].current_bid,
-                                    loser[0].current_bid
-                                )
-                                for winner in queue[player_index:winners_count]:
-                                    winner[0].wealth_change += bid // (winners_count - player_index)
-                                loser[0].current_bid -= bid
-                                deal.bank -= bid
-                    new_player_list = [
-                        player for player in players if player.current_bid > 0
-                    ]
-                    _define_winner(deal, new_player_list)
-
-        _define_winner(self, deal_players)
-        for player_order, player in enumerate(self.players):
-            logging.info(
-                f'Player{player_order} {player.name}: wealth: {player.wealth}, '
-                f'status: {player.STATUS[player.status]}, '
-                f'combo: {player.summary(self)}, '
-                f'change: {f"+{player.wealth_change}" if player.wealth_change > 0 else player.wealth_change}'
+        """
+        Распределение банка. Банк делится на уровни по ставкам не сбросивших
+        карты игроков (основной банк и побочные банки): каждый уровень
+        достается сильнейшей комбинации среди игроков, поставивших не
+        меньше этого уровня, при равенстве - делится поровну, а остаток от
+        деления получают первые по порядку победители. Ставки сбросивших
+        карты игроков сверх последнего уровня достаются его победителям.
+        """
+        contenders = [
+            player for player in self.players
+            if player.status != player_status.FOLD
+        ]
+        self.showdown = len(contenders) > 1
+        if not self.showdown:
+            strength = {contenders[0]: 0}
+        else:
+            strength = {
+                player: player.combination(self) for player in contenders
+            }
+        levels = sorted(set(player.current_bid for player in contenders))
+        top = max(player.current_bid for player in self.players)
+        previous_level = 0
+        for level in levels:
+            upper = top if level == levels[-1] else level
+            pot = sum(
+                min(player.current_bid, upper)
+                - min(player.current_bid, previous_level)
+                for player in self.players
             )
+            previous_level = level
+            eligible = [
+                player for player in contenders if player.current_bid >= level
+            ]
+            best = max(strength[player] for player in eligible)
+            winners = [
+                player for player in eligible if strength[player] == best
+            ]
+            share, remainder = divmod(pot, len(winners))
+            for winner_order, winner in enumerate(winners):
+                winner.wealth_change += share + (winner_order < remainder)
+        for player in self.players:
+            self.record(player, history.RESULT, player.wealth_change)
+        self.bank = 0
         self.show_info()
         self.clean()
 
@@ -566,6 +562,8 @@ class Deal:
             player.current_bid = 0
 
     def show_info(self):
+        if self.headless:
+            return
         if self.table:
             self.show_table()
         for player in self.players:
@@ -612,50 +610,96 @@ class Game:
     def __init__(
             self,
             players: list[Player],
-            settings: GameSettings
+            settings: GameSettings,
+            headless: bool = False,
+            history: HandHistoryWriter | None = None,
+            deck: Deck | None = None
     ):
-        logging.info('*' * 10 + 'NEW GAME' + '*' * 10)
+        """
+        :param players: игроки; решения принимают их источники решений
+            (Player.provider).
+        :param settings: настройки игры.
+        :param headless: играть без вывода в консоль и без расчета
+            вероятностей выигрыша (см. Deal).
+        :param history: запись истории раздач (см. модуль history).
+        :param deck: колода, используемая во всех раздачах игры (например,
+            с собственным генератором случайных чисел).
+        """
+        self.deck = Deck() if deck is None else deck
+        self.headless = headless
+        self.history = history
+        logger.info('*' * 10 + 'NEW GAME' + '*' * 10)
         self.id = str(hex(hash(self)))[2:10]
         self.deal = 0
+        self.showdowns = 0
         # random.shuffle(players)
         self.players = players
         self.active_players = self.players
         self.settings = settings
         players_count = len(players)
-        logging.info(f'GameID: {self.id}, players count: {players_count}, '
-                     f'max trade rounds: {self.settings.reraise_count_limit}')
+        logger.info(
+            'GameID: %s, players count: %s, max trade rounds: %s',
+            self.id, players_count, self.settings.reraise_count_limit
+        )
         for i, player in enumerate(self.players):
-            logging.info(
-                f'Player{i}: id: {player.player_id}, name: {player.name}, '
-                f'wealth: {player.wealth}{", bot" if player.is_bot else ""}'
+            logger.info(
+                'Player%s: id: %s, name: %s, wealth: %s%s',
+                i, player.player_id, player.name, player.wealth,
+                ', bot' if player.is_bot else ''
             )
-        self.new_deal()
 
-    def new_deal(self):
+    @property
+    def is_over(self) -> bool:
+        return len(self.active_players) < 2
+
+    def play(self, deals_limit: int | None = None) -> 'Game':
+        """
+        Разыгрывает раздачи, пока у двух и более игроков есть фишки.
+        Каждая раздача создается, разыгрывается и сразу же отбрасывается,
+        поэтому память не растет с количеством раздач.
+        :param deals_limit: максимальное количество раздач.
+        """
+        while not self.is_over and (
+            deals_limit is None or self.deal < deals_limit
+        ):
+            self.new_deal()
+        return self
+
+    def new_deal(self) -> bool:
+        """
+        Разыгрывает одну раздачу.
+        :return: True, если игра может быть продолжена.
+        """
         self.deal += 1
-        logging.info(f'Deal {self.deal}')
+        logger.info('Deal %s', self.deal)
         self.active_players = [
             player for player in self.active_players if player.wealth > 0
         ]
         deal = Deal(
             players=self.active_players,
             small_blind_rate=self.settings.small_blind_rate,
+            headless=self.headless,
+            history=self.history,
+            game_id=int(self.id, 16),
+            deal_id=self.deal,
+            deck=self.deck,
             # limit=self.settings.reraise_count_limit
-        )
+        ).play()
+        self.showdowns += deal.showdown
         self.active_players = self.active_players[1:] + self.active_players[:1]
         self.active_players = [
             player for player in self.active_players if player.wealth > 0
         ]
-        if len(self.active_players) > 1:
-            self.new_deal()
+        return not self.is_over
 
 
 if __name__ == '__main__':
-    logging.config.dictConfig(LOGGING_CONFIG)
+    setup_logging()
     player_list = [
         Player(False, 1, 100, 'Player1'),
         Player(False, 2, 100, 'Player2'),
         Player(False, 3, 100, 'Player3'),
     ]
     game_settings = GameSettings()
-    Game(player_list, game_settings)
+    with HandHistoryWriter(HISTORY_FILENAME) as hand_history:
+        Game(player_list, game_settings, history=hand_history).play()
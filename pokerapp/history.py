@@ -0,0 +1,142 @@
+"""
+История раздач в компактном двоичном формате.
+
+Каждое событие раздачи (карты игрока на очередной улице, обязательная
+ставка, действие игрока, итог раздачи) записывается как запись
+фиксированной длины. Записи копятся в буфере и дописываются в файл
+пакетами, поэтому запись истории почти ничего не стоит по сравнению с
+самой раздачей; файл не ротируется и данные не теряются.
+
+Формат файла: заголовок '<4sHH' (сигнатура, версия, длина записи), затем
+записи RECORD:
+    game - номер игры, deal - номер раздачи в игре, stage - улица (см.
+    модуль game_stage), seat - место игрока в раздаче, action - действие
+    (см. модуль actions) или событие CARDS/RESULT, cards - коды карт руки и
+    стола (см. evaluator.card_code, -1 - карты нет), equity - доля банка
+    игрока (NaN, если не считалась), amount - ставка игрока (для RESULT -
+    изменение его фишек), stack - фишки игрока в начале раздачи, bank -
+    банк после события.
+"""
+import struct
+import typing
+
+import numpy as np
+
+
+MAGIC = b'PKHH'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+RECORD = struct.Struct('<IIBBb7bfiii')
+RECORD_DTYPE = np.dtype([
+    ('game', '<u4'),
+    ('deal', '<u4'),
+    ('stage', 'u1'),
+    ('seat', 'u1'),
+    ('action', 'i1'),
+    ('cards', 'i1', (7,)),
+    ('equity', '<f4'),
+    ('amount', '<i4'),
+    ('stack', '<i4'),
+    ('bank', '<i4'),
+])
+
+# События, не являющиеся действиями игрока.
+CARDS = -2
+RESULT = -3
+
+# Размер буфера записи в байтах.
+BUFFER_SIZE = 1 << 16
+
+NO_CARDS = (-1,) * 7
+
+
+class HandHistoryWriter:
+    def __init__(self, path: str, buffer_size: int = BUFFER_SIZE) -> None:
+        """
+        Открывает файл истории для дозаписи.
+        :param path: путь к файлу.
+        :param buffer_size: размер буфера в байтах, при заполнении которого
+            записи сбрасываются в файл.
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer = bytearray()
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+
+    def write(
+        self,
+        game: int,
+        deal: int,
+        stage: int,
+        seat: int,
+        action: int,
+        cards: typing.Tuple[int, ...],
+        equity: float,
+        amount: int,
+        stack: int,
+        bank: int
+    ) -> None:
+        """
+        Добавляет запись в буфер.
+        :param cards: до 7 кодов карт (рука, затем стол).
+        """
+        self._buffer += RECORD.pack(
+            game, deal, stage, seat, action,
+            *(cards + NO_CARDS)[:7], equity, amount, stack, bank
+        )
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        self._file.write(self._buffer)
+        self._file.flush()
+        self._buffer.clear()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self) -> 'HandHistoryWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def read_history(
+    path: str, chunk_size: int = 65536
+) -> typing.Iterator[np.ndarray]:
+    """
+    Потоковое чтение истории.
+    :param path: путь к файлу.
+    :param chunk_size: количество записей в одном блоке.
+    :return: блоки записей - структурированные массивы с типом RECORD_DTYPE.
+    """
+    with open(path, 'rb') as history_file:
+        magic, version, record_size = HEADER.unpack(
+            history_file.read(HEADER.size)
+        )
+        if magic != MAGIC or version != VERSION or (
+            record_size != RECORD_DTYPE.itemsize
+        ):
+            raise ValueError(f'Unsupported hand history: {path}')
+        while True:
+            data = history_file.read(chunk_size * record_size)
+            if len(data) < record_size:
+                return
+            yield np.frombuffer(
+                data[:len(data) - len(data) % record_size], dtype=RECORD_DTYPE
+            )
+
+
+def load_history(path: str) -> np.ndarray:
+    """
+    Вся история одним массивом.
+    """
+    chunks = list(read_history(path))
+    if not chunks:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.concatenate(chunks)
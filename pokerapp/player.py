@@ -7,6 +7,12 @@ from cards import _calculate_max_value, _calculate_p_win, rank_to_cards
 from exceptions import ExceededValueError, InsufficientRaiseError, MinRaiseError
 # from pokerapp import Deal
 import player_status
+from providers import ActionProvider, console_provider, PassiveActionProvider
+
+
+# Точность оценки вероятности выигрыша игрока: полуширина 95%-го
+# доверительного интервала в долях банка.
+P_WIN_HALF_WIDTH = 0.005
 
 
 class Player:
@@ -16,7 +22,14 @@ class Player:
     STATUS = {player_status.FOLD: 'FOLD', player_status.ACTIVE: 'ACTIVE',
               player_status.ALL_IN: 'ALL-IN'}
 
-    def __init__(self, is_bot: bool, player_id: int, wealth: int, name: str = None) -> None:
+    def __init__(
+        self,
+        is_bot: bool,
+        player_id: int,
+        wealth: int,
+        name: str = None,
+        provider: ActionProvider | None = None
+    ) -> None:
         """
         Статус игрока может принимать целое число от 0 до 2, где
             0 - игрок не участвует в раздаче (сбросил карты или не имеет
@@ -28,6 +41,9 @@ class Player:
         :param player_id:
         :param wealth:
         :param name:
+        :param provider: источник решений игрока (см. модуль providers); по
+            умолчанию для человека - консоль, для бота -
+            PassiveActionProvider.
         """
         self.status = player_status.ACTIVE
         self.is_bot = is_bot
@@ -41,6 +57,9 @@ class Player:
         self.hand = None
         self.ambition = 0
         self.wealth_change = 0
+        if provider is None:
+            provider = PassiveActionProvider() if is_bot else console_provider
+        self.provider = provider
 
     def give_hand(self, two_cards):
         self.hand = two_cards
@@ -48,7 +67,10 @@ class Player:
     def calculate_p_win(self, players_count, table=None):
         if table:
             table = list(table)
-        return _calculate_p_win(list(self.hand), players_count, table, n=50000)
+        return _calculate_p_win(
+            list(self.hand), players_count, table, n=50000,
+            half_width=P_WIN_HALF_WIDTH
+        )
 
     def p_win(self, deal):
         return self.calculate_p_win(
@@ -0,0 +1,143 @@
+"""
+Таблица вероятностей выигрыша на пре-флопе.
+
+Для каждой из 169 стартовых рук (пары, одномастные и разномастные
+сочетания номиналов) и каждого количества игроков от 2 до 8 в таблице
+хранятся доля банка и ее стандартная ошибка. Таблица строится один раз
+(python preflop.py [<количество раздач>]) и сохраняется в компактный
+двоичный файл, который затем отображается в память и читается за O(1).
+
+Формат файла: заголовок '<4sHBBI' (сигнатура, версия, минимальное и
+максимальное количество игроков, количество раздач на одну руку), затем
+массив float32 формы (количество игроков, 169, 2): доля банка (0-1) и
+стандартная ошибка.
+"""
+import logging
+import os
+import struct
+import sys
+import typing
+
+import numpy as np
+
+from canonical import canonicalize
+from config import PREFLOP_TABLE_PATH
+from equity import monte_carlo
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PFEQ'
+VERSION = 1
+HEADER = struct.Struct('<4sHBBI')
+MIN_PLAYERS = 2
+MAX_PLAYERS = 8
+HANDS_COUNT = 169
+
+
+def hand_index(hand: typing.Sequence[typing.Tuple[int, int]]) -> int:
+    """
+    Номер стартовой руки от 0 до 168: клетка матрицы 13x13, где для
+    одномастных рук строка - старший номинал, для разномастных - младший.
+    В канонической форме (см. модуль canonical) старшая карта руки имеет
+    масть 0, а младшая - 0 для одномастных рук и 1 для остальных.
+    """
+    ((high, _), (low, low_suit)), _, _ = canonicalize(hand)
+    if low_suit == 0:
+        return high * 13 + low
+    return low * 13 + high
+
+
+def representative(index: int) -> typing.Tuple[typing.Tuple[int, int], ...]:
+    """
+    Рука в канонической форме, соответствующая номеру стартовой руки.
+    """
+    row, column = divmod(index, 13)
+    if row > column:
+        return (row, 0), (column, 0)
+    return (column, 0), (row, 1)
+
+
+class PreflopTable:
+    def __init__(self, path: str = PREFLOP_TABLE_PATH) -> None:
+        """
+        Отображает файл таблицы в память.
+        :param path: путь к файлу таблицы.
+        """
+        with open(path, 'rb') as table_file:
+            header = table_file.read(HEADER.size)
+        magic, version, min_players, max_players, samples = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'Unsupported preflop table: {path}')
+        self.min_players = min_players
+        self.max_players = max_players
+        self.samples = samples
+        self._data = np.memmap(
+            path, dtype='<f4', mode='r', offset=HEADER.size,
+            shape=(max_players - min_players + 1, HANDS_COUNT, 2)
+        )
+
+    def lookup(
+        self,
+        hand: typing.Sequence[typing.Tuple[int, int]],
+        players_count: int
+    ) -> typing.Tuple[float, float] | None:
+        """
+        :return: доля банка (0-1) и ее стандартная ошибка, либо None, если
+            такого количества игроков в таблице нет.
+        """
+        if not self.min_players <= players_count <= self.max_players:
+            return None
+        equity, stderr = self._data[players_count - self.min_players, hand_index(hand)]
+        return float(equity), float(stderr)
+
+
+_table = None
+
+
+def get_table() -> PreflopTable | None:
+    """
+    Таблица, загружаемая при первом обращении. Если файла нет или он
+    устаревшей версии, возвращает None.
+    """
+    global _table
+    if _table is None:
+        try:
+            _table = PreflopTable()
+        except (OSError, ValueError) as error:
+            logger.warning('Preflop table is not available: %s', error)
+            _table = False
+    return _table or None
+
+
+def build(
+    n: int = 200000,
+    path: str = PREFLOP_TABLE_PATH,
+    seed: int | None = None
+) -> None:
+    """
+    Строит таблицу методом Монте-Карло и сохраняет ее в файл.
+    :param n: количество раздач на каждую руку и количество игроков.
+    :param path: путь к файлу таблицы.
+    :param seed: зерно генератора случайных чисел.
+    """
+    rng = np.random.default_rng(seed)
+    data = np.zeros(
+        (MAX_PLAYERS - MIN_PLAYERS + 1, HANDS_COUNT, 2), dtype='<f4'
+    )
+    for players_count in range(MIN_PLAYERS, MAX_PLAYERS + 1):
+        for index in range(HANDS_COUNT):
+            result = monte_carlo(representative(index), players_count, n=n, rng=rng)
+            data[players_count - MIN_PLAYERS, index] = result.equity, result.stderr
+        logger.info('Preflop table: %s players done', players_count)
+    with open(path + '.tmp', 'wb') as table_file:
+        table_file.write(
+            HEADER.pack(MAGIC, VERSION, MIN_PLAYERS, MAX_PLAYERS, n)
+        )
+        table_file.write(data.tobytes())
+    os.replace(path + '.tmp', path)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    build(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
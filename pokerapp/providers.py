@@ -0,0 +1,150 @@
+"""
+Источники решений игроков.
+
+Раздача (game.Deal) не обращается к консоли напрямую: на каждом ходе она
+определяет список доступных действий и запрашивает решение у источника,
+назначенного игроку (Player.provider). Источник может запрашивать действие
+у человека (ConsoleActionProvider), воспроизводить заранее заданную
+последовательность (ScriptedActionProvider) или принимать решение
+самостоятельно (PassiveActionProvider, RandomActionProvider).
+"""
+import random
+import typing
+
+import actions
+from actions import ACTIONS
+from exceptions import ExceededValueError, InsufficientRaiseError, MinRaiseError
+
+
+class ActionProvider:
+    """
+    Базовый класс источника решений.
+    """
+    def choose_action(self, deal, player, allow_actions: typing.List[str]) -> str:
+        """
+        :param deal: раздача.
+        :param player: игрок, который делает ход.
+        :param allow_actions: доступные действия (см. модуль actions).
+        :return: одно из доступных действий.
+        """
+        raise NotImplementedError
+
+    def choose_raise(self, deal, player, min_bid: int, max_bid: int) -> int:
+        """
+        Размер ставки при повышении.
+        :param min_bid: минимальная допустимая ставка.
+        :param max_bid: максимальная ставка, имеющая смысл.
+        :return: новая ставка игрока.
+        """
+        return min_bid
+
+    def reject_raise(self, player, error: Exception) -> None:
+        """
+        Вызывается, если ставка, возвращенная choose_raise, недопустима.
+        После этого ставка запрашивается повторно. По умолчанию ошибка
+        пробрасывается дальше - автоматический источник не должен
+        предлагать недопустимых ставок.
+        """
+        raise error
+
+
+class ConsoleActionProvider(ActionProvider):
+    """
+    Запрос действия у человека через консоль.
+    """
+    MESSAGES = {
+        ExceededValueError: 'У Вас нет столько фишек.',
+        MinRaiseError: 'Минимальное повышение равно blind.',
+        InsufficientRaiseError: 'Ставка должна быть выше текущей ставки в игре.',
+    }
+
+    def choose_action(self, deal, player, allow_actions):
+        print(player.info(deal))
+        msg = (
+            f'Текущая ставка: {deal.current_bid}; Ваша текущая ставка: '
+            f'{player.current_bid}; blind: {deal.blind}.\nВаш ход ('
+            + ', '.join([act + ' - ' + ACTIONS[act] for act in allow_actions])
+            + '): '
+        )
+        action = input(msg)
+        while action not in allow_actions:
+            print('Введите число - один из предложенных варианов.')
+            action = input(msg)
+        return action
+
+    def choose_raise(self, deal, player, min_bid, max_bid):
+        while True:
+            try:
+                return int(input(
+                    f'Введите свою ставку (целое число от {min_bid}'
+                    f' до {max_bid}): '
+                ))
+            except ValueError:
+                print('Введите целое число.')
+
+    def reject_raise(self, player, error):
+        print(self.MESSAGES.get(
+            type(error), 'Что-то пошло не так, попробуйте еще раз.'
+        ))
+
+
+class ScriptedActionProvider(ActionProvider):
+    """
+    Воспроизведение заранее заданной последовательности решений - для
+    регрессионных прогонов. Элемент последовательности - действие либо
+    пара (actions.RAISE, ставка). Если действие недоступно, выбирается
+    check (или fold, если check невозможен); после окончания сценария
+    игрок только проверяет и сбрасывает карты.
+    """
+    def __init__(self, script: typing.Iterable[str | typing.Tuple[str, int]]) -> None:
+        self._script = iter(script)
+        self._bid = None
+
+    def choose_action(self, deal, player, allow_actions):
+        step = next(self._script, actions.CHECK)
+        bid = None
+        if isinstance(step, tuple):
+            step, bid = step
+        if step not in allow_actions:
+            step = actions.CHECK if actions.CHECK in allow_actions else actions.FOLD
+        # ставка нужна только для повышения, выбранного сейчас
+        self._bid = bid if step == actions.RAISE else None
+        return step
+
+    def choose_raise(self, deal, player, min_bid, max_bid):
+        bid, self._bid = self._bid, None
+        return min_bid if bid is None else max(min_bid, min(bid, max_bid))
+
+
+class PassiveActionProvider(ActionProvider):
+    """
+    Бот, который никогда не повышает ставку: check, если это возможно,
+    иначе call, иначе all-in.
+    """
+    PREFERENCE = (actions.CHECK, actions.CALL, actions.ALL_IN, actions.FOLD)
+
+    def choose_action(self, deal, player, allow_actions):
+        for action in self.PREFERENCE:
+            if action in allow_actions:
+                return action
+        return actions.FOLD
+
+
+class RandomActionProvider(ActionProvider):
+    """
+    Бот, выбирающий случайное действие из доступных (fold - только если
+    нельзя сделать check) и случайную ставку при повышении.
+    """
+    def __init__(self, seed: int | None = None) -> None:
+        self._random = random.Random(seed)
+
+    def choose_action(self, deal, player, allow_actions):
+        if actions.CHECK in allow_actions:
+            allow_actions = [act for act in allow_actions if act != actions.FOLD]
+        return self._random.choice(allow_actions)
+
+    def choose_raise(self, deal, player, min_bid, max_bid):
+        return self._random.randint(min_bid, max(min_bid, max_bid))
+
+
+console_provider = ConsoleActionProvider()
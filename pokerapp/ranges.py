@@ -0,0 +1,299 @@
+"""
+Расчет вероятности выигрыша против диапазонов рук.
+
+Диапазон - взвешенное множество стартовых рук соперника в обычной
+записи, например 'QQ+, AKs, 50% AQo, A2s-A5s, 76s'. Руки диапазона
+выбираются с вероятностями, пропорциональными весам, с помощью таблиц
+псевдонимов (alias method, O(1) на выбор). Таблица строится только из
+рук, не пересекающихся с известными картами (рука игрока, стол,
+сброшенные карты), и перестраивается лишь при изменении этих карт.
+
+Раздачи разыгрываются блоками, как в модуле equity: руки всех игроков
+выбираются из их диапазонов, раздачи, в которых руки разных игроков
+пересекаются, переигрываются, стол добирается из оставшихся карт, и все
+руки оцениваются одним вызовом evaluate_batch.
+"""
+import functools
+import itertools
+import operator
+import re
+import typing
+
+import numpy as np
+
+from cardset import as_card_set, CardSet
+from equity import (
+    DEFAULT_BLOCK_SIZE, EMPTY_RESULT, EquityResult, evaluate_block,
+    live_cards, sample_cards, score_block, to_codes
+)
+
+
+RANK_CHARS = '23456789TJQKA'
+
+# Максимальное количество попыток переиграть раздачи с пересекающимися
+# руками игроков.
+CONFLICT_ROUNDS = 100
+
+_WEIGHT = re.compile(r'^\d+(?:\.\d+)?$')
+_TOKEN = re.compile(
+    r'^([2-9TJQKA])([2-9TJQKA])([SO]?)(\+?)'
+    r'(?:-([2-9TJQKA])([2-9TJQKA])[SO]?)?$'
+)
+
+
+def _combos(high: int, low: int, kind: str) -> typing.List[typing.Tuple[int, int]]:
+    """
+    Пары кодов карт (value * 4 + suit) для рук номиналов high и low:
+    kind 'S' - одномастные, 'O' - разномастные, '' - все.
+    """
+    if high == low:
+        return [
+            (high * 4 + second, high * 4 + first)
+            for first, second in itertools.combinations(range(4), 2)
+        ]
+    return [
+        (high * 4 + high_suit, low * 4 + low_suit)
+        for high_suit in range(4) for low_suit in range(4)
+        if kind == '' or (kind == 'S') == (high_suit == low_suit)
+    ]
+
+
+def parse_range(text: str) -> typing.Dict[typing.Tuple[int, int], float]:
+    """
+    Разбирает запись диапазона.
+    Элементы через запятую: 'AKs' (одномастные), 'AKo' (разномастные),
+    'AK' (все), 'QQ' (пара), 'QQ+' (QQ, KK, AA), 'A2s+' (A2s..AKs),
+    '22-55', 'A2s-A5s'; перед элементом может стоять вес: '50% AQo'.
+    Десятка записывается как 'T' или '10'.
+    :return: словарь {(код старшей карты, код младшей карты): вес}.
+    """
+    combos = {}
+    for token in text.split(','):
+        weight, percent, hand = token.partition('%')
+        if not percent:
+            weight, hand = '', weight
+        weight, hand = weight.strip(), hand.strip().upper().replace('10', 'T')
+        if not hand and not percent:
+            continue
+        match = _TOKEN.match(hand)
+        if match is None or (percent and not _WEIGHT.match(weight)):
+            raise ValueError(f'Invalid range: {token.strip()}')
+        first, second, kind, plus, last_first, last_second = match.groups()
+        weight = float(weight) / 100 if percent else 1.0
+        high, low = sorted(
+            (RANK_CHARS.index(first), RANK_CHARS.index(second)), reverse=True
+        )
+        if high == low:
+            if plus:
+                top = 12
+            elif last_first:
+                top = RANK_CHARS.index(last_first)
+            else:
+                top = high
+            hands = [(rank, rank) for rank in range(min(high, top), max(high, top) + 1)]
+        else:
+            if plus:
+                top = high - 1
+            elif last_second:
+                top = RANK_CHARS.index(last_second)
+            else:
+                top = low
+            hands = [(high, rank) for rank in range(min(low, top), max(low, top) + 1)]
+        for hand_high, hand_low in hands:
+            for combo in _combos(hand_high, hand_low, kind):
+                combos[combo] = weight
+    return combos
+
+
+def alias_table(weights: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Таблица псевдонимов (метод Воза) для выбора с вероятностями,
+    пропорциональными weights.
+    :return: вероятности и псевдонимы ячеек.
+    """
+    size = weights.size
+    scaled = weights * (size / weights.sum())
+    prob = np.ones(size)
+    alias = np.arange(size)
+    small = [i for i in range(size) if scaled[i] < 1.0]
+    large = [i for i in range(size) if scaled[i] >= 1.0]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        prob[less] = scaled[less]
+        alias[less] = more
+        scaled[more] += scaled[less] - 1.0
+        (small if scaled[more] < 1.0 else large).append(more)
+    return prob, alias
+
+
+class HandRange:
+    def __init__(
+        self,
+        combos: str | typing.Dict[typing.Tuple[int, int], float] | None = None
+    ) -> None:
+        """
+        :param combos: запись диапазона (см. parse_range), словарь
+            {(код, код): вес} или None - любая рука с равной вероятностью.
+        """
+        if isinstance(combos, str):
+            combos = parse_range(combos)
+        elif combos is None:
+            combos = dict.fromkeys(itertools.combinations(range(52), 2), 1.0)
+        combos = {combo: weight for combo, weight in combos.items() if weight > 0}
+        if not combos:
+            raise ValueError('Empty range')
+        self.codes = np.array(list(combos), dtype=np.int8)
+        self.weights = np.array(list(combos.values()), dtype=np.float64)
+        self.masks = (
+            np.left_shift(1, self.codes[:, 0], dtype=np.int64)
+            | np.left_shift(1, self.codes[:, 1], dtype=np.int64)
+        )
+        self._dead = None
+        self._table = None
+
+    @classmethod
+    def from_hand(cls, hand: typing.Sequence[typing.Tuple[int, int]]) -> 'HandRange':
+        """
+        Диапазон из одной известной руки.
+        """
+        return cls({tuple(to_codes(hand).tolist()): 1.0})
+
+    def __len__(self) -> int:
+        return self.weights.size
+
+    def _alias(self, dead: int) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Руки, не пересекающиеся с известными картами, и их таблица
+        псевдонимов; перестраивается только при изменении dead.
+        :param dead: маска известных карт (бит - код карты).
+        """
+        if dead != self._dead:
+            allowed = (self.masks & np.int64(dead)) == 0
+            if not allowed.any():
+                raise ValueError('No hands of the range are possible')
+            self._table = (
+                self.codes[allowed], *alias_table(self.weights[allowed])
+            )
+            self._dead = dead
+        return self._table
+
+    def sample(self, rng: np.random.Generator, count: int, dead: int = 0) -> np.ndarray:
+        """
+        Выбирает count рук с учетом весов.
+        :param dead: маска известных карт (бит - код карты).
+        :return: массив кодов формы (count, 2).
+        """
+        codes, prob, alias = self._alias(dead)
+        index = rng.integers(0, prob.size, size=count)
+        index = np.where(rng.random(count) < prob[index], index, alias[index])
+        return codes[index]
+
+
+def _code_mask(codes: np.ndarray) -> int:
+    mask = 0
+    for code in codes.tolist():
+        mask |= 1 << code
+    return mask
+
+
+def _deal_ranges(
+    rng: np.random.Generator,
+    ranges: typing.Sequence[HandRange],
+    count: int,
+    dead: typing.Sequence[int]
+) -> np.ndarray:
+    """
+    Выбирает руки всех игроков так, чтобы они не пересекались.
+    :param dead: маски карт, недоступных каждому из игроков.
+    :return: массив кодов формы (count, players_count, 2).
+    """
+    hands = np.stack(
+        [hand_range.sample(rng, count, mask) for hand_range, mask in zip(ranges, dead)],
+        axis=1
+    )
+    for _ in range(CONFLICT_ROUNDS):
+        cards = np.sort(hands.reshape(count, -1), axis=1)
+        conflicts = np.flatnonzero((cards[:, 1:] == cards[:, :-1]).any(axis=1))
+        if not conflicts.size:
+            return hands
+        hands[conflicts] = np.stack(
+            [
+                hand_range.sample(rng, conflicts.size, mask)
+                for hand_range, mask in zip(ranges, dead)
+            ],
+            axis=1
+        )
+    raise ValueError('Ranges are too narrow to deal non-conflicting hands')
+
+
+def range_equity(
+    ranges: typing.Sequence[HandRange | str | typing.Sequence[typing.Tuple[int, int]] | None],
+    table: typing.Sequence[typing.Tuple[int, int]] | None = None,
+    dead: typing.Iterable[typing.Tuple[int, int]] | CardSet = (),
+    n: int = 20000,
+    rng: np.random.Generator | None = None,
+    block_size: int = DEFAULT_BLOCK_SIZE
+) -> EquityResult:
+    """
+    Доля банка первого игрока, когда карты каждого игрока выбираются из
+    его диапазона.
+    :param ranges: диапазоны игроков, первый - игрока, для которого
+        считается результат: HandRange, запись диапазона, две известные
+        карты или None (любые карты).
+    :param table: известные карты стола (0-5 карт).
+    :param dead: другие известные карты, которых нет ни у кого из игроков.
+    :param n: количество разыгрываемых раздач.
+    :param rng: генератор случайных чисел NumPy.
+    :param block_size: количество раздач, разыгрываемых за один блок.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    ranges = [
+        hand_range if isinstance(hand_range, HandRange)
+        else HandRange(hand_range) if hand_range is None or isinstance(hand_range, str)
+        else HandRange.from_hand(hand_range)
+        for hand_range in ranges
+    ]
+    players_count = len(ranges)
+    board = to_codes(table)
+    known = np.concatenate([board, to_codes(as_card_set(dead))])
+    dead_mask = _code_mask(known)
+    # Известные руки (из одной комбинации) исключаются из диапазонов
+    # остальных игроков сразу, а не переигрыванием раздач.
+    fixed = [
+        int(hand_range.masks[0]) if len(hand_range) == 1 else 0
+        for hand_range in ranges
+    ]
+    dead_masks = [
+        dead_mask | functools.reduce(
+            operator.or_, fixed[:index] + fixed[index + 1:], 0
+        )
+        for index in range(players_count)
+    ]
+    live = live_cards(known)
+    need = 5 - board.size
+    result = EMPTY_RESULT
+    for start in range(0, n, block_size):
+        count = min(block_size, n - start)
+        hands = _deal_ranges(rng, ranges, count, dead_masks)
+        # Первые need карт перемешанной колоды, не попавшие в руки игроков.
+        drawn = sample_cards(rng, live, count, need + 2 * players_count)
+        taken = (drawn[:, :, None] == hands.reshape(count, 1, -1)).any(axis=2)
+        order = np.argsort(taken, axis=1, kind='stable')[:, :need]
+        boards = np.concatenate(
+            [
+                np.broadcast_to(board, (count, board.size)),
+                np.take_along_axis(drawn, order, axis=1)
+            ],
+            axis=1
+        )
+        block = np.concatenate(
+            [
+                hands,
+                np.broadcast_to(boards[:, None, :], (count, players_count, 5))
+            ],
+            axis=2
+        )
+        result += score_block(evaluate_block(block))
+    return result
@@ -0,0 +1,376 @@
+"""
+Пакетная симуляция игр между ботами.
+
+Каждая игра (game.Game в режиме headless) разыгрывается со своим зерном,
+поэтому результат любой игры воспроизводится отдельно. Игры делятся на
+пакеты, которые считаются в пуле процессов. Результат пакета сразу по
+готовности записывается в отдельный сжатый файл numpy
+<каталог>/part-<номер первой игры>.npz со столбцами:
+    seeds - зерна игр (games,);
+    hands - количество сыгранных раздач (games,);
+    showdowns - количество раздач, дошедших до вскрытия (games,);
+    positions - занятые места по игрокам, 1 - победитель (games, players);
+    chips - фишки игроков через каждые chips_interval раздач, начиная с
+        начального состояния (games, checkpoints, players);
+    strategies - стратегии игроков (players,);
+    settings - параметры play_game в JSON (строка).
+В памяти остаются только суммы для сводки (SimulationTotals), поэтому
+объем памяти не зависит от количества игр, а при прерывании сохраняются
+все завершенные пакеты: при повторном запуске с тем же каталогом и теми
+же параметрами они не пересчитываются (с другими параметрами запуск
+завершается ошибкой). Столбцы всех игр собирает load_results.
+
+Запуск: python simulator.py <количество игр> [<каталог>] [--strategies ...]
+"""
+import argparse
+import concurrent.futures
+import glob
+import json
+import logging
+import os
+import random
+import time
+import typing
+
+import numpy as np
+
+from cards import Deck
+from game import Game, GameSettings
+from player import Player
+from providers import ActionProvider, PassiveActionProvider, RandomActionProvider
+
+
+logger = logging.getLogger(__name__)
+
+# Количество игр в одном задании для пула процессов.
+GAMES_PER_TASK = 50
+
+# Уровень логирования модуля game в симуляциях: записи о каждой раздаче
+# не нужны.
+GAME_LOG_LEVEL = logging.WARNING
+
+STRATEGIES = {
+    'passive': lambda seed: PassiveActionProvider(),
+    'random': RandomActionProvider,
+}
+
+
+def make_provider(strategy: str, seed: int) -> ActionProvider:
+    """
+    :param strategy: название стратегии из STRATEGIES.
+    :param seed: зерно для стратегий, использующих случайность.
+    """
+    return STRATEGIES[strategy](seed)
+
+
+class GameStats(typing.NamedTuple):
+    hands: int
+    showdowns: int
+    positions: np.ndarray
+    chips: np.ndarray
+
+
+def play_game(
+    seed: int,
+    strategies: typing.Sequence[str],
+    wealth: int = 100,
+    small_blind_rate: int = 1,
+    deals_limit: int = 1000,
+    chips_interval: int = 50
+) -> GameStats:
+    """
+    Разыгрывает одну игру ботов.
+    :param seed: зерно игры - определяет колоды и решения ботов.
+    :param strategies: стратегии игроков (см. STRATEGIES).
+    :param wealth: начальное количество фишек.
+    :param small_blind_rate: размер малого блайнда.
+    :param deals_limit: максимальное количество раздач.
+    :param chips_interval: через сколько раздач записывать фишки игроков.
+    :return: статистика игры. Места выбывших игроков определяются
+        порядком выбывания (выбывшие в одной раздаче делят место), места
+        оставшихся - количеством фишек.
+    """
+    seeds = random.Random(seed)
+    players = [
+        Player(
+            True, seat, wealth, f'Bot{seat}',
+            make_provider(strategy, seeds.getrandbits(32))
+        )
+        for seat, strategy in enumerate(strategies)
+    ]
+    game = Game(
+        players, GameSettings(small_blind_rate), headless=True,
+        deck=Deck(rng=random.Random(seeds.getrandbits(32)))
+    )
+    chips = np.empty(
+        (deals_limit // chips_interval + 1, len(players)), dtype=np.int32
+    )
+    chips[0] = wealth
+    eliminated = [0] * len(players)
+    while not game.is_over and game.deal < deals_limit:
+        game.new_deal()
+        for seat, player in enumerate(players):
+            if player.wealth <= 0 and not eliminated[seat]:
+                eliminated[seat] = game.deal
+        if game.deal % chips_interval == 0:
+            chips[game.deal // chips_interval] = [
+                player.wealth for player in players
+            ]
+    checkpoint = game.deal // chips_interval + 1
+    chips[checkpoint:] = [player.wealth for player in players]
+
+    order = sorted(
+        range(len(players)),
+        key=lambda seat: (eliminated[seat] or deals_limit + 1, players[seat].wealth),
+        reverse=True
+    )
+    positions = np.empty(len(players), dtype=np.int8)
+    for place, seat in enumerate(order):
+        previous = order[place - 1] if place else None
+        if previous is not None and eliminated[seat] and (
+            eliminated[seat] == eliminated[previous]
+        ):
+            positions[seat] = positions[previous]
+        else:
+            positions[seat] = place + 1
+    return GameStats(game.deal, game.showdowns, positions, chips)
+
+
+def _play_games(seeds: typing.Sequence[int], kwargs: dict) -> typing.List[GameStats]:
+    logging.getLogger('game').setLevel(GAME_LOG_LEVEL)
+    return [play_game(seed, **kwargs) for seed in seeds]
+
+
+class SimulationTotals:
+    """
+    Суммы по сыгранным играм, из которых строится сводка (summary).
+    """
+
+    def __init__(self, strategies: typing.Sequence[str]) -> None:
+        players_count = len(strategies)
+        self.strategies = list(strategies)
+        self.games = 0
+        self.hands = 0
+        self.showdowns = 0
+        self.positions = np.zeros(players_count, dtype=np.int64)
+        self.wins = np.zeros(players_count, dtype=np.int64)
+        self.final_chips = np.zeros(players_count, dtype=np.int64)
+
+    def add(self, columns: typing.Dict[str, np.ndarray]) -> None:
+        """
+        Добавляет результаты игр (столбцы, как в файлах пакетов).
+        """
+        self.games += len(columns['seeds'])
+        self.hands += int(columns['hands'].sum())
+        self.showdowns += int(columns['showdowns'].sum())
+        self.positions += columns['positions'].sum(axis=0, dtype=np.int64)
+        self.wins += (columns['positions'] == 1).sum(axis=0)
+        self.final_chips += columns['chips'][:, -1].sum(axis=0, dtype=np.int64)
+
+
+def _part_path(path: str, start: int) -> str:
+    return os.path.join(path, f'part-{start:010d}.npz')
+
+
+def _save_part(part_path: str, columns: typing.Dict[str, np.ndarray]) -> None:
+    """
+    Записывает файл пакета атомарно: прерванная запись не оставляет
+    поврежденного файла.
+    """
+    with open(part_path + '.tmp', 'wb') as part_file:
+        np.savez_compressed(part_file, **columns)
+    os.replace(part_path + '.tmp', part_path)
+
+
+def _settings(kwargs: dict) -> str:
+    return json.dumps(kwargs, sort_keys=True)
+
+
+def _part_settings(part_path: str, columns: typing.Dict[str, np.ndarray]) -> str:
+    """
+    :raise ValueError: если в файле пакета нет параметров игр.
+    """
+    if 'settings' not in columns:
+        raise ValueError(f'{part_path}: simulation settings are not recorded')
+    return str(columns['settings'])
+
+
+def _load_part(
+    part_path: str, seeds: typing.Sequence[int], settings: str
+) -> typing.Dict[str, np.ndarray] | None:
+    """
+    Результаты пакета из ранее записанного файла, если он есть и
+    относится к тем же играм.
+    :param settings: параметры play_game (см. _settings).
+    :raise ValueError: если пакет записан с другими параметрами игр -
+        смешивать такие результаты в одном каталоге нельзя.
+    """
+    try:
+        with np.load(part_path) as part:
+            columns = {name: part[name] for name in part.files}
+    except (OSError, ValueError, KeyError):
+        return None
+    if columns.get('seeds') is None or columns['seeds'].tolist() != list(seeds):
+        return None
+    if _part_settings(part_path, columns) != settings:
+        raise ValueError(
+            f'{part_path} was simulated with other settings '
+            f'({columns["settings"]}, now {settings}); use another directory'
+        )
+    return columns
+
+
+def load_results(path: str) -> typing.Dict[str, np.ndarray]:
+    """
+    Собирает столбцы всех игр из файлов пакетов каталога path (в порядке
+    номеров игр).
+    :raise FileNotFoundError: если в каталоге нет файлов пакетов.
+    """
+    part_paths = sorted(glob.glob(os.path.join(path, 'part-*.npz')))
+    if not part_paths:
+        raise FileNotFoundError(f'No simulation results in {path}')
+    parts = []
+    for part_path in part_paths:
+        with np.load(part_path) as part:
+            parts.append({name: part[name] for name in part.files})
+        if _part_settings(part_path, parts[-1]) != str(parts[0]['settings']):
+            raise ValueError(
+                f'{part_path} was simulated with other settings than '
+                f'{part_paths[0]}'
+            )
+    columns = {
+        name: np.concatenate([part[name] for part in parts])
+        for name in ('seeds', 'hands', 'showdowns', 'positions', 'chips')
+    }
+    columns['strategies'] = parts[0]['strategies']
+    columns['settings'] = parts[0]['settings']
+    return columns
+
+
+def simulate(
+    games: int,
+    strategies: typing.Sequence[str],
+    path: str | None = None,
+    seed: int = 0,
+    workers: int | None = None,
+    wealth: int = 100,
+    small_blind_rate: int = 1,
+    deals_limit: int = 1000,
+    chips_interval: int = 50
+) -> SimulationTotals:
+    """
+    Разыгрывает games игр в пуле процессов; игра номер i получает зерно
+    seed + i.
+    :param path: каталог для файлов пакетов (если задан). Пакеты, уже
+        записанные в нем с теми же зернами, не пересчитываются.
+    :raise ValueError: если в каталоге есть пакеты, записанные с другими
+        параметрами игр.
+    :param workers: количество процессов (по умолчанию - количество ядер;
+        1 - без пула, в текущем процессе).
+    Остальные параметры - как у play_game.
+    :return: суммы для сводки (см. summary).
+    """
+    kwargs = {
+        'strategies': list(strategies),
+        'wealth': wealth,
+        'small_blind_rate': small_blind_rate,
+        'deals_limit': deals_limit,
+        'chips_interval': chips_interval,
+    }
+    settings = _settings(kwargs)
+    totals = SimulationTotals(strategies)
+    seeds = np.arange(seed, seed + games, dtype=np.int64)
+    starts = range(0, games, GAMES_PER_TASK)
+    tasks = {
+        start: seeds[start:start + GAMES_PER_TASK].tolist() for start in starts
+    }
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+        for start in starts:
+            columns = _load_part(_part_path(path, start), tasks[start], settings)
+            if columns is not None:
+                totals.add(columns)
+                del tasks[start]
+        if totals.games:
+            logger.info('Simulation: %s games loaded from %s', totals.games, path)
+
+    def store(start, results):
+        columns = {
+            'seeds': np.array(tasks[start], dtype=np.int64),
+            'hands': np.array([stats.hands for stats in results], dtype=np.int32),
+            'showdowns': np.array(
+                [stats.showdowns for stats in results], dtype=np.int32
+            ),
+            'positions': np.stack([stats.positions for stats in results]),
+            'chips': np.stack([stats.chips for stats in results]),
+            'strategies': np.array(strategies),
+            'settings': np.array(settings),
+        }
+        if path is not None:
+            _save_part(_part_path(path, start), columns)
+        totals.add(columns)
+
+    started = time.monotonic()
+    if workers == 1:
+        for start, task in tasks.items():
+            store(start, _play_games(task, kwargs))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            futures = {
+                executor.submit(_play_games, task, kwargs): start
+                for start, task in tasks.items()
+            }
+            for done, future in enumerate(
+                concurrent.futures.as_completed(futures), 1
+            ):
+                store(futures[future], future.result())
+                if done % 100 == 0:
+                    logger.info(
+                        'Simulation: %s games, %.1fs',
+                        totals.games, time.monotonic() - started
+                    )
+    return totals
+
+
+def summary(totals: SimulationTotals) -> str:
+    """
+    Краткая сводка результатов: среднее место и доля побед каждого игрока,
+    среднее количество раздач и частота вскрытий. Сводку по сохраненным
+    результатам можно получить, добавив load_results(path) в
+    SimulationTotals.
+    """
+    games = max(totals.games, 1)
+    lines = [
+        f'Games: {totals.games}, '
+        f'hands per game: {totals.hands / games:.1f}, '
+        f'showdown frequency: {totals.showdowns / max(totals.hands, 1):.3f}'
+    ]
+    for seat, strategy in enumerate(totals.strategies):
+        lines.append(
+            f'Seat {seat} ({strategy}): '
+            f'mean position {totals.positions[seat] / games:.3f}, '
+            f'wins {totals.wins[seat] / games:.3f}, '
+            f'final chips {totals.final_chips[seat] / games:.1f}'
+        )
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    logger.setLevel(logging.INFO)
+    parser = argparse.ArgumentParser(description='Симуляция игр ботов.')
+    parser.add_argument('games', type=int)
+    parser.add_argument('path', nargs='?', default='simulation')
+    parser.add_argument(
+        '--strategies', nargs='+', default=['random', 'passive'] * 3,
+        choices=sorted(STRATEGIES)
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--wealth', type=int, default=100)
+    parser.add_argument('--deals-limit', type=int, default=1000)
+    args = parser.parse_args()
+    print(summary(simulate(
+        args.games, args.strategies, args.path, args.seed, args.workers,
+        args.wealth, deals_limit=args.deals_limit
+    )))
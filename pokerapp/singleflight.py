@@ -0,0 +1,90 @@
+"""
+Объединение одинаковых одновременных расчетов.
+
+Пока расчет с некоторым ключом выполняется, новые запросы с тем же
+ключом не запускают его заново, а присоединяются к выполняющемуся и
+получают его результат. Каждый запрос получает собственный объект
+Future, который можно отменить, не затрагивая остальных; расчет
+отменяется, только если отменены все присоединенные к нему запросы (и
+он еще не начал выполняться).
+"""
+import concurrent.futures
+import functools
+import threading
+import typing
+
+
+class SingleFlight:
+    def __init__(self, executor: concurrent.futures.Executor) -> None:
+        """
+        :param executor: пул, в котором выполняются расчеты.
+        """
+        self.executor = executor
+        self.calls = 0
+        self.coalesced = 0
+        # ключ -> (Future расчета, Future присоединенных запросов)
+        self._flights = {}
+        self._lock = threading.RLock()
+
+    def submit(
+        self, key: typing.Hashable, fn: typing.Callable, *args
+    ) -> concurrent.futures.Future:
+        """
+        Запускает fn(*args) в пуле, если расчет с ключом key еще не
+        выполняется, и присоединяет к нему новый запрос.
+        :return: Future запроса.
+        """
+        waiter = concurrent.futures.Future()
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = (self.executor.submit(fn, *args), [])
+                started = True
+                self.calls += 1
+            else:
+                started = False
+                self.coalesced += 1
+            flight[1].append(waiter)
+        waiter.add_done_callback(functools.partial(self._detach, key, flight))
+        if started:
+            flight[0].add_done_callback(functools.partial(self._resolve, key))
+        return waiter
+
+    def _resolve(self, key: typing.Hashable, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            _, waiters = self._flights.pop(key)
+            waiters = list(waiters)
+        for waiter in waiters:
+            try:
+                if future.cancelled():
+                    waiter.cancel()
+                elif future.exception() is not None:
+                    waiter.set_exception(future.exception())
+                else:
+                    waiter.set_result(future.result())
+            except concurrent.futures.InvalidStateError:
+                # запрос отменен одновременно с завершением расчета
+                pass
+
+    def _detach(
+        self,
+        key: typing.Hashable,
+        flight: typing.Tuple[concurrent.futures.Future, list],
+        waiter: concurrent.futures.Future
+    ) -> None:
+        if not waiter.cancelled():
+            return
+        future, waiters = flight
+        with self._lock:
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters and self._flights.get(key) is flight:
+                # при успешной отмене _resolve вызывается сразу в этом же
+                # потоке (поэтому блокировка - RLock) и удаляет расчет
+                future.cancel()
+
+    def __len__(self) -> int:
+        """
+        Количество выполняющихся (и ожидающих в пуле) расчетов.
+        """
+        return len(self._flights)
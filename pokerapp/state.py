@@ -0,0 +1,396 @@
+"""
+Хранилище состояния диалогов телеграм-бота.
+
+Состояние чата - запись ChatState фиксированного вида (шаг диалога,
+выбранные карты, количество игроков, стадия игры, карты стола), которая
+упаковывается в 10 байт. Хранилища:
+    MemoryStateStore - в памяти процесса, ограничено по количеству
+        записей (LRU) и по времени жизни записи;
+    SqliteStateStore - в файле SQLite: переживает перезапуск бота и может
+        использоваться несколькими процессами. По умолчанию каждое
+        изменение сразу записывается в базу (batch_size=1). С
+        batch_size > 1 изменения копятся в буфере и записываются пакетами
+        (одной транзакцией) - при заполнении буфера, фоновым потоком раз в
+        flush_interval секунд, при закрытии, завершении процесса и по
+        сигналам SIGTERM и SIGINT; в этом режиме процессы, работающие с
+        одним файлом, должны обслуживать разные чаты, а при аварийном
+        завершении теряются изменения последних flush_interval секунд.
+        Состояния с истекшим временем жизни удаляются из базы при открытии
+        и затем фоновым потоком раз в purge_interval секунд, поэтому
+        размер базы ограничен количеством чатов, активных за время ttl.
+"""
+import atexit
+import collections
+import logging
+import os
+import signal
+import sqlite3
+import struct
+import threading
+import time
+import typing
+
+from cardset import CardSet
+from config import (STATE_BACKEND, STATE_BATCH_SIZE, STATE_PATH, STATE_SIZE,
+                    STATE_TTL)
+
+
+logger = logging.getLogger(__name__)
+
+# Как часто (в секундах) из базы SQLite удаляются устаревшие состояния.
+PURGE_INTERVAL = 600
+
+# шаг, первая карта, вторая карта, количество игроков, стадия, стол
+RECORD = struct.Struct('<bbbbb5b')
+
+Card = typing.Tuple[int, int]
+
+
+def _pack_card(card: Card | None) -> int:
+    return -1 if card is None else card[0] * 4 + card[1]
+
+
+def _unpack_card(code: int) -> Card | None:
+    return None if code < 0 else (code >> 2, code & 3)
+
+
+class ChatState:
+    """
+    Состояние диалога расчета вероятности выигрыша.
+    """
+    __slots__ = (
+        'step', 'first_card', 'second_card', 'players_count', 'stage', 'table'
+    )
+
+    def __init__(
+        self,
+        step: int = 0,
+        first_card: Card | None = None,
+        second_card: Card | None = None,
+        players_count: int | None = None,
+        stage: int | None = None,
+        table: typing.Tuple[Card, ...] = ()
+    ) -> None:
+        self.step = step
+        self.first_card = first_card
+        self.second_card = second_card
+        self.players_count = players_count
+        self.stage = stage
+        self.table = tuple(table)
+
+    @property
+    def used(self) -> CardSet:
+        """
+        Уже выбранные карты (в руке и на столе).
+        """
+        return CardSet.from_cards(
+            card for card in (self.first_card, self.second_card, *self.table)
+            if card is not None
+        )
+
+    def pack(self) -> bytes:
+        table = [_pack_card(card) for card in self.table]
+        return RECORD.pack(
+            self.step,
+            _pack_card(self.first_card),
+            _pack_card(self.second_card),
+            -1 if self.players_count is None else self.players_count,
+            -1 if self.stage is None else self.stage,
+            *(table + [-1] * (5 - len(table)))
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes) -> 'ChatState':
+        step, first, second, players_count, stage, *table = RECORD.unpack(data)
+        return cls(
+            step,
+            _unpack_card(first),
+            _unpack_card(second),
+            None if players_count < 0 else players_count,
+            None if stage < 0 else stage,
+            tuple(_unpack_card(code) for code in table if code >= 0)
+        )
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ChatState) and self.pack() == other.pack()
+
+    def __repr__(self) -> str:
+        return 'ChatState({})'.format(', '.join(
+            f'{name}={getattr(self, name)!r}' for name in self.__slots__
+        ))
+
+
+class StateStore:
+    """
+    Интерфейс хранилища: состояние чата читается get, после изменения
+    сохраняется set, при завершении диалога удаляется delete.
+    """
+
+    def get(self, chat_id: int) -> ChatState | None:
+        """
+        :return: состояние чата, либо None, если диалога нет.
+        """
+        raise NotImplementedError
+
+    def set(self, chat_id: int, state: ChatState) -> None:
+        raise NotImplementedError
+
+    def delete(self, chat_id: int) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryStateStore(StateStore):
+    def __init__(self, maxsize: int = 100000, ttl: float | None = None) -> None:
+        """
+        :param maxsize: максимальное количество чатов; при превышении
+            удаляются давно не использованные.
+        :param ttl: время жизни состояния в секундах с последнего
+            изменения (None - без ограничения).
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chat_id: int) -> ChatState | None:
+        with self._lock:
+            entry = self._data.get(chat_id)
+            if entry is None:
+                return None
+            if self.ttl is not None and time.monotonic() - entry[1] >= self.ttl:
+                del self._data[chat_id]
+                return None
+            self._data.move_to_end(chat_id)
+            return entry[0]
+
+    def set(self, chat_id: int, state: ChatState) -> None:
+        with self._lock:
+            self._data[chat_id] = (state, time.monotonic())
+            self._data.move_to_end(chat_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, chat_id: int) -> None:
+        with self._lock:
+            self._data.pop(chat_id, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SqliteStateStore(StateStore):
+    def __init__(
+        self,
+        path: str,
+        ttl: float | None = None,
+        batch_size: int = 1,
+        flush_interval: float = 1.0,
+        purge_interval: float = PURGE_INTERVAL
+    ) -> None:
+        """
+        :param path: путь к файлу базы данных.
+        :param ttl: время жизни состояния в секундах с последнего
+            изменения (None - без ограничения).
+        :param batch_size: количество измененных чатов, при котором
+            изменения записываются в базу (1 - запись при каждом изменении).
+        :param flush_interval: при batch_size > 1 изменения записываются
+            фоновым потоком не реже, чем раз в flush_interval секунд.
+        :param purge_interval: при заданном ttl устаревшие состояния
+            удаляются из базы раз в purge_interval секунд.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.purge_interval = purge_interval
+        self._connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS chat_state ('
+            'chat_id INTEGER PRIMARY KEY, state BLOB NOT NULL, '
+            'updated REAL NOT NULL)'
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS chat_state_updated ON chat_state (updated)'
+        )
+        # chat_id -> (упакованное состояние или None для удаления, время)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._signals = {}
+        atexit.register(self.close)
+        self.purge()
+        if batch_size > 1 or ttl is not None:
+            threading.Thread(
+                target=self._maintenance_loop, name='state-maintenance',
+                daemon=True
+            ).start()
+        if batch_size > 1:
+            self._install_signal_handlers()
+
+    def get(self, chat_id: int) -> ChatState | None:
+        with self._lock:
+            if chat_id in self._pending:
+                data = self._pending[chat_id][0]
+                return None if data is None else ChatState.unpack(data)
+            row = self._connection.execute(
+                'SELECT state, updated FROM chat_state WHERE chat_id = ?',
+                (chat_id,)
+            ).fetchone()
+        if row is None or (
+            self.ttl is not None and time.time() - row[1] >= self.ttl
+        ):
+            return None
+        return ChatState.unpack(row[0])
+
+    def set(self, chat_id: int, state: ChatState) -> None:
+        self._write(chat_id, state.pack())
+
+    def delete(self, chat_id: int) -> None:
+        self._write(chat_id, None)
+
+    def _write(self, chat_id: int, data: bytes | None) -> None:
+        with self._lock:
+            self._pending[chat_id] = (data, time.time())
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _maintenance_loop(self) -> None:
+        """
+        Фоновый поток: записывает буфер (при batch_size > 1) и удаляет
+        устаревшие состояния (при заданном ttl).
+        """
+        batched = self.batch_size > 1
+        interval = (
+            min(self.flush_interval, self.purge_interval) if batched
+            else self.purge_interval
+        )
+        purged = time.monotonic()
+        while not self._closed.wait(interval):
+            try:
+                if batched:
+                    self.flush()
+                if self.ttl is not None and (
+                    time.monotonic() - purged >= self.purge_interval
+                ):
+                    purged = time.monotonic()
+                    self.purge()
+            except sqlite3.Error:
+                logger.exception('Failed to maintain chat state')
+
+    def _install_signal_handlers(self) -> None:
+        """
+        Записывает буфер по SIGTERM и SIGINT, после чего вызывает прежний
+        обработчик сигнала. Обработчики устанавливаются только из
+        главного потока.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self._signals[signum] = signal.signal(signum, self._on_signal)
+
+    def _on_signal(self, signum, frame) -> None:
+        # Обработчик выполняется в главном потоке между инструкциями: если
+        # блокировку держит сам главный поток, ждать ее нельзя.
+        if self._lock.acquire(timeout=1):
+            try:
+                if self._connection is not None:
+                    self._flush()
+            except sqlite3.Error:
+                logger.exception('Failed to flush chat state')
+            finally:
+                self._lock.release()
+        previous = self._signals.get(signum)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous == signal.SIG_DFL:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        updated = [
+            (chat_id, data, timestamp)
+            for chat_id, (data, timestamp) in self._pending.items()
+            if data is not None
+        ]
+        deleted = [
+            (chat_id,) for chat_id, (data, _) in self._pending.items()
+            if data is None
+        ]
+        with self._connection:
+            self._connection.execute('BEGIN')
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO chat_state VALUES (?, ?, ?)', updated
+            )
+            self._connection.executemany(
+                'DELETE FROM chat_state WHERE chat_id = ?', deleted
+            )
+        self._pending.clear()
+
+    def purge(self) -> int:
+        """
+        Удаляет из базы состояния с истекшим временем жизни.
+        :return: количество удаленных записей.
+        """
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            if self._connection is None:
+                return 0
+            self._flush()
+            with self._connection:
+                self._connection.execute('BEGIN')
+                return self._connection.execute(
+                    'DELETE FROM chat_state WHERE updated < ?',
+                    (time.time() - self.ttl,)
+                ).rowcount
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._lock:
+            if self._connection is None:
+                return
+            self._flush()
+            self._connection.close()
+            self._connection = None
+        atexit.unregister(self.close)
+        if threading.current_thread() is threading.main_thread():
+            for signum, previous in self._signals.items():
+                if signal.getsignal(signum) == self._on_signal:
+                    signal.signal(signum, previous)
+        self._signals.clear()
+
+    def __len__(self) -> int:
+        self.flush()
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM chat_state'
+        ).fetchone()[0]
+
+
+def open_state_store(backend: str = STATE_BACKEND) -> StateStore:
+    """
+    Хранилище, заданное настройками: backend 'memory' или 'sqlite'.
+    """
+    if backend == 'memory':
+        return MemoryStateStore(STATE_SIZE, STATE_TTL)
+    if backend == 'sqlite':
+        return SqliteStateStore(STATE_PATH, STATE_TTL, STATE_BATCH_SIZE)
+    raise ValueError(f'Unknown state backend: {backend}')
@@ -1,29 +1,125 @@
 import collections
+import concurrent.futures
+import functools
 import logging
-import logging.config
 import os
+import threading
 
 import requests
 
 from telegram import ReplyKeyboardMarkup
+from telegram.error import TelegramError
 from telegram.ext import (CommandHandler, Filters,
                           MessageHandler, Updater)
 
-from cards import _calculate_p_win, Card, SUIT, SUIT_R, VALUE, VALUE_R
-from config import LOGGING_CONFIG, TELEGRAM_TOKEN
+from cache import equity_cache
+from cards import _calculate_p_win, Card, p_win_key, SUIT, SUIT_R, VALUE, VALUE_R
+from config import (CALCULATION_QUEUE_SIZE, CALCULATION_WORKERS,
+                    setup_logging, TELEGRAM_TOKEN)
+from preflop import get_table
+from singleflight import SingleFlight
+from state import ChatState, open_state_store
 
 
 
 logger = logging.getLogger(__name__)
 
 
-class State:
-    def __init__(self):
-        self.users = {}
+def _keyboard(rows):
+    return ReplyKeyboardMarkup(
+        rows,
+        resize_keyboard=True,
+        one_time_keyboard=True,
+        remove_keyboard=True
+    )
+
+
+# Клавиатуры строятся один раз при запуске.
+LOW_CARDS_KEYBOARD = _keyboard(
+    [[v + suit for v in list('23456789')] for suit in SUIT_R] + [['>>']]
+)
+HIGH_CARDS_KEYBOARD = _keyboard(
+    [[v + suit for v in ['10'] + list('JQKA')] for suit in SUIT_R] + [['<<']]
+)
+PLAYERS_KEYBOARD = _keyboard([[str(i) for i in range(2, 9)]])
+STAGE_KEYBOARD = _keyboard([[str(i) for i in range(0, 4)]])
+CALCULATE_KEYBOARD = _keyboard([['/calculate']])
+
+PLAYERS_TEXTS = frozenset(str(i) for i in range(2, 9))
+
+# Обозначение карты -> карта (<номинал>, <масть>). Кроме мастей SUIT_R
+# принимаются закрашенные значки и буквы s, h, d, c; десятка - '10' или 'T'.
+SUIT_ALIASES = dict(
+    SUIT_R, **{'♠': 0, '♡': 1, '♢': 2, '♣': 3, 'S': 0, 'H': 1, 'D': 2, 'C': 3}
+)
+CARDS_R = {
+    value_text + suit_text: (value, suit)
+    for value_text, value in dict(VALUE_R, T=VALUE_R['10']).items()
+    for suit_text, suit in SUIT_ALIASES.items()
+}
+CARD_TEXTS = frozenset(value + suit for value in VALUE_R for suit in SUIT_R)
+
+EQ_USAGE = (
+    'Формат: /eq <рука> <количество игроков> [<карты стола>], '
+    'например /eq A♤K♥ 6 Q♥7♧2♤'
+)
+
+
+def parse_cards(text):
+    """
+    Разбирает карты, записанные подряд (например 'A♤10♥' или 'AsTh').
+    :return: список карт (<номинал>, <масть>), либо None, если запись
+        некорректна.
+    """
+    text = text.upper()
+    cards = []
+    position = 0
+    while position < len(text):
+        card = CARDS_R.get(text[position:position + 2])
+        if card is not None:
+            position += 2
+        else:
+            card = CARDS_R.get(text[position:position + 3])
+            if card is None:
+                return None
+            position += 3
+        cards.append(card)
+    return cards
+
+
+def parse_eq(text):
+    """
+    Разбирает аргументы команды /eq.
+    :return: рука, количество игроков и карты стола.
+    :raise ValueError: с описанием ошибки для пользователя.
+    """
+    args = text.split()[1:]
+    if len(args) not in (2, 3):
+        raise ValueError(EQ_USAGE)
+    hand = parse_cards(args[0])
+    table = parse_cards(args[2]) if len(args) == 3 else []
+    if hand is None or table is None:
+        raise ValueError('Не удалось разобрать карты. ' + EQ_USAGE)
+    if len(hand) != 2:
+        raise ValueError('В руке должно быть 2 карты')
+    if len(table) not in (0, 3, 4, 5):
+        raise ValueError('На столе может быть 0, 3, 4 или 5 карт')
+    if len(set(hand + table)) != len(hand) + len(table):
+        raise ValueError('Карты повторяются')
+    if args[1] not in PLAYERS_TEXTS:
+        raise ValueError('Количество игроков - от 2 до 8')
+    return tuple(hand), int(args[1]), tuple(table)
 
 
 class PokerBot(object):
-    def __init__(self, token):
+    def __init__(self, token, executor=None, state=None):
+        """
+        :param token: токен бота.
+        :param executor: пул, в котором выполняются расчеты (по умолчанию
+            - пул из CALCULATION_WORKERS процессов).
+        :param state: хранилище состояния диалогов (по умолчанию - заданное
+            настройками, см. state.open_state_store).
+        """
         self.updater = Updater(token=token)
 
         self.updater.dispatcher.add_handler(
@@ -32,11 +128,24 @@ class PokerBot(object):
         self.updater.dispatcher.add_handler(
             CommandHandler('calculate', self.init_calculation)
         )
+        self.updater.dispatcher.add_handler(
+            CommandHandler('eq', self.eq)
+        )
         self.updater.dispatcher.add_handler(
             MessageHandler(Filters.text, self.message_handler)
         )
-        self.cache = {}
-        self.state = State()
+        self.cache = equity_cache
+        self.state = open_state_store() if state is None else state
+        self.executor = (
+            concurrent.futures.ProcessPoolExecutor(CALCULATION_WORKERS)
+            if executor is None else executor
+        )
+        # одинаковые одновременные запросы считаются один раз
+        self.flights = SingleFlight(self.executor)
+        # chat_id -> Future незавершенного запроса чата; изменяется и
+        # диспетчером, и потоками пула, поэтому доступ - под блокировкой
+        self.requests = {}
+        self._requests_lock = threading.Lock()
 
     def start(self):
         self.updater.start_polling()
@@ -44,122 +153,68 @@ class PokerBot(object):
     def message_handler(self, update, context):
         chat_id = update.message.chat_id
         incoming_message = update.message.text
-        logging.info(f'{chat_id}, {incoming_message}')
-        if not self.state.users.get(chat_id):
+        logger.info('%s, %s', chat_id, incoming_message)
+        user = self.state.get(chat_id)
+        if user is None:
             return self.init_calculation(update, context)
 
-        state = self.state.users[chat_id].get('step') or 0
-        cards = [
-            v + suit for v in [str(i) for i in range(2, 11)] + list('JQKA')
-            for suit in ['\u2664', '\u2665', '\u2666', '\u2667']
-        ]
+        state = user.step
         if state == 0:
             if incoming_message == '>>':
-                button = ReplyKeyboardMarkup(
-                    [
-                        [v + suit for v in ['10'] + list('JQKA')]
-                        for suit in ['\u2664', '\u2665', '\u2666', '\u2667']
-                    ] + [['<<']],
-                    resize_keyboard=True,
-                    one_time_keyboard=True,
-                    remove_keyboard=True
-                )
                 context.bot.send_message(
                     chat_id=chat_id,
                     text='Выберите первую карту',
-                    reply_markup=button
+                    reply_markup=HIGH_CARDS_KEYBOARD
                 )
             elif incoming_message == '<<':
-                button = ReplyKeyboardMarkup(
-                    [
-                        [v + suit for v in list('23456789')]
-                        for suit in ['\u2664', '\u2665', '\u2666', '\u2667']
-                    ] + [['>>']],
-                    resize_keyboard=True,
-                    one_time_keyboard=True,
-                    remove_keyboard=True
-                )
                 context.bot.send_message(
                     chat_id=chat_id,
                     text='Выберите первую карту',
-                    reply_markup=button
-                )
-            elif incoming_message in cards:
-                button = ReplyKeyboardMarkup(
-                    [
-                        [v + suit for v in list('23456789')]
-                        for suit in ['\u2664', '\u2665', '\u2666', '\u2667']
-                    ] + [['>>']],
-                    resize_keyboard=True,
-                    one_time_keyboard=True,
-                    remove_keyboard=True
+                    reply_markup=LOW_CARDS_KEYBOARD
                 )
+            elif incoming_message in CARD_TEXTS:
                 context.bot.send_message(
                     chat_id=chat_id,
                     text='Выберите вторую карту',
-                    reply_markup=button
+                    reply_markup=LOW_CARDS_KEYBOARD
                 )
-                self.state.users[chat_id]['step'] = 1
-                logging.info(f'{chat_id}, step 1: {incoming_message}')
-                self.state.users[chat_id]['1st_card'] = (
+                user.step = 1
+                logger.info('%s, step 1: %s', chat_id, incoming_message)
+                user.first_card = (
                     VALUE_R[incoming_message[:-1]], SUIT_R[incoming_message[-1]]
                 )
+                self.state.set(chat_id, user)
         elif state == 1:
             if incoming_message == '>>':
-                button = ReplyKeyboardMarkup(
-                    [
-                        [v + suit for v in ['10'] + list('JQKA')]
-                        for suit in ['\u2664', '\u2665', '\u2666', '\u2667']
-                    ] + [['<<']],
-                    resize_keyboard=True,
-                    one_time_keyboard=True,
-                    remove_keyboard=True
-                )
                 context.bot.send_message(
                     chat_id=chat_id,
                     text='Выберите вторую карту',
-                    reply_markup=button
+                    reply_markup=HIGH_CARDS_KEYBOARD
                 )
             elif incoming_message == '<<':
-                button = ReplyKeyboardMarkup(
-                    [
-                        [v + suit for v in list('23456789')]
-                        for suit in ['\u2664', '\u2665', '\u2666', '\u2667']
-                    ] + [['>>']],
-                    resize_keyboard=True,
-                    one_time_keyboard=True,
-                    remove_keyboard=True
-                )
                 context.bot.send_message(
                     chat_id=chat_id,
                     text='Выберите вторую карту',
-                    reply_markup=button
+                    reply_markup=LOW_CARDS_KEYBOARD
                 )
-            elif incoming_message in cards:
-                button = ReplyKeyboardMarkup(
-                    [[str(i) for i in range(2, 9)]],
-                    resize_keyboard=True,
-                    one_time_keyboard=True,
-                    remove_keyboard=True
+            elif self._is_used(user, incoming_message):
+                context.bot.send_message(
+                    chat_id=chat_id, text='Эта карта уже выбрана'
                 )
+            elif incoming_message in CARD_TEXTS:
                 context.bot.send_message(
                     chat_id=chat_id,
                     text='Введите количество игроков',
-                    reply_markup=button
+                    reply_markup=PLAYERS_KEYBOARD
                 )
-                self.state.users[chat_id]['step'] = 2
-                logging.info(f'{chat_id}, step 2: {incoming_message}')
-                self.state.users[chat_id]['2nd_card'] = (
+                user.step = 2
+                logger.info('%s, step 2: %s', chat_id, incoming_message)
+                user.second_card = (
                     VALUE_R[incoming_message[:-1]], SUIT_R[incoming_message[-1]]
                 )
+                self.state.set(chat_id, user)
         elif state == 2:
-            if incoming_message in [str(i) for i in range(2, 9)]:
-                button = ReplyKeyboardMarkup(
-                    [[str(i) for i in range(0, 4)]],
-                    resize_keyboard=True,
-                    one_time_keyboard=True,
-                    remove_keyboard=True
-                )
+            if incoming_message in PLAYERS_TEXTS:
                 context.bot.send_message(
                     chat_id=chat_id,
                     text=(
@@ -167,197 +222,229 @@ class PokerBot(object):
                         '1 - флоп (на столе 3 карты)\n2 - тёрн (на столе 4 карты)\n'
                         '3 - ривер (на столе 5 карт)'
                     ),
-                    reply_markup=button
+                    reply_markup=STAGE_KEYBOARD
                 )
-                self.state.users[chat_id]['step'] = 3
-                logging.info(f'{chat_id}, step 3. Игроков {incoming_message}')
-                self.state.users[chat_id]['n_players'] = int(incoming_message)
-
-                self.state.users[chat_id]['turn'] = None
-                self.state.users[chat_id]['river'] = None
+                user.step = 3
+                logger.info('%s, step 3. Игроков %s', chat_id, incoming_message)
+                user.players_count = int(incoming_message)
+                self.state.set(chat_id, user)
         elif state == 3:
             if incoming_message == '0':
-                context.bot.send_message(chat_id=chat_id, text=f'Производится расчет...')
-                p = _calculate_p_win(
-                    (self.state.users[chat_id]['1st_card'], self.state.users[chat_id]['2nd_card']),
-                    self.state.users[chat_id]['n_players']
-                )
-                text = 'Игроков: {}. Рука: {}{}. P = {:.04}%'.format(
-                    self.state.users[chat_id]['n_players'],
-                    Card(*self.state.users[chat_id]['1st_card']),
-                    Card(*self.state.users[chat_id]['2nd_card']),
-                    p
-                )
-                context.bot.send_message(
-                    chat_id=chat_id,
-                    text=text
-                )
-                logging.info(
-                    '{}, step 3. Игроков {}. Стадия 0. Рука: {}{}. P = {:.04}%'.format(
-                        chat_id,
-                        self.state.users[chat_id]['n_players'],
-                        Card(*self.state.users[chat_id]['1st_card']),
-                        Card(*self.state.users[chat_id]['2nd_card']),
-                        p
-                    )
-                )
-                self.state.users[chat_id] = {}
-                button = ReplyKeyboardMarkup(
-                    [['/calculate']],
-                    resize_keyboard=True,
-                    one_time_keyboard=True,
-                    remove_keyboard=True
-                )
-                context.bot.send_message(
-                    chat_id=chat_id,
-                    text=(
-                        'Если хотите продолжить, Вам нужно последовательно задать следующие параметры:\n'
-                        '1. Первую карту в руке.\n2. Вторую карту в руке.\n'
-                        '3. Количество игроков.\n4. Стадию игры, где 0 - пре-флоп '
-                        '(на столе нет карт), 1 - флоп (на столе 3 карты), 2 - тёрн'
-                        ' (на столе 4 карты), 3 - ривер (на столе 5 карт).\n'
-                        '5. Поочередно указать все карты на столе, если они есть.\n'
-                        '6. Указать другие карты, которые вам известны - они будут '
-                        'убраны из генерации.'
-                    ),
-                    reply_markup=button
-                )
+                self._calculate_state(context, chat_id, user)
             elif incoming_message in ('1', '2', '3'):
-                self.state.users[chat_id]['stage'] = int(incoming_message)
-                self.state.users[chat_id]['step'] = 4
-                self.state.users[chat_id]['table'] = []
-                button = ReplyKeyboardMarkup(
-                    [
-                        [v + suit for v in list('23456789')]
-                        for suit in ['\u2664', '\u2665', '\u2666', '\u2667']
-                    ] + [['>>']],
-                    resize_keyboard=True,
-                    one_time_keyboard=True,
-                    remove_keyboard=True
-                )
+                user.stage = int(incoming_message)
+                user.step = 4
+                user.table = ()
+                self.state.set(chat_id, user)
                 context.bot.send_message(
                     chat_id=chat_id,
                     text='Выберите карту',
-                    reply_markup=button
+                    reply_markup=LOW_CARDS_KEYBOARD
                 )
         elif state == 4:
-            if len(self.state.users[chat_id]['table']) < self.state.users[chat_id]['stage'] + 2:
+            if len(user.table) < user.stage + 2:
                 if incoming_message == '>>':
-                    button = ReplyKeyboardMarkup(
-                        [
-                            [v + suit for v in ['10'] + list('JQKA')]
-                            for suit in ['\u2664', '\u2665', '\u2666', '\u2667']
-                        ] + [['<<']],
-                        resize_keyboard=True,
-                        one_time_keyboard=True,
-                        remove_keyboard=True
-                    )
                     context.bot.send_message(
                         chat_id=chat_id,
                         text='Выберите вторую карту',
-                        reply_markup=button
+                        reply_markup=HIGH_CARDS_KEYBOARD
                     )
                 elif incoming_message == '<<':
-                    button = ReplyKeyboardMarkup(
-                        [
-                            [v + suit for v in list('23456789')]
-                            for suit in ['\u2664', '\u2665', '\u2666', '\u2667']
-                        ] + [['>>']],
-                        resize_keyboard=True,
-                        one_time_keyboard=True,
-                        remove_keyboard=True
-                    )
                     context.bot.send_message(
                         chat_id=chat_id,
                         text='Выберите вторую карту',
-                        reply_markup=button
+                        reply_markup=LOW_CARDS_KEYBOARD
                     )
-                elif incoming_message in cards:
-                    self.state.users[chat_id]['table'] += [
-                        (VALUE_R[incoming_message[:-1]], SUIT_R[incoming_message[-1]])
-                    ]
-                    if len(self.state.users[chat_id]['table']) == self.state.users[chat_id]['stage'] + 2:
-                        context.bot.send_message(chat_id=chat_id, text=f'Производится расчет...')
-                        p = _calculate_p_win(
-                            (self.state.users[chat_id]['1st_card'], self.state.users[chat_id]['2nd_card']),
-                            self.state.users[chat_id]['n_players'], self.state.users[chat_id]['table']
-                        )
-                        text = 'Игроков: {}. Рука: {}{}. Стол: {}.\nP = {:.04}%'.format(
-                            self.state.users[chat_id]['n_players'],
-                            Card(*self.state.users[chat_id]['1st_card']),
-                            Card(*self.state.users[chat_id]['2nd_card']),
-                            ''.join([str(Card(*i)) for i in self.state.users[chat_id]['table']]),
-                            p
-                        )
-                        context.bot.send_message(
-                            chat_id=chat_id,
-                            text=text
-                        )
-                        logging.info(
-                            '{}, step 3. Игроков {}. Стадия {}. Рука: {}{}. Стол: {}. P = {:.04}%'.format(
-                                chat_id,
-                                self.state.users[chat_id]['n_players'],
-                                self.state.users[chat_id]['stage'],
-                                Card(*self.state.users[chat_id]['1st_card']),
-                                Card(*self.state.users[chat_id]['2nd_card']),
-                                ''.join([str(Card(*i)) for i in self.state.users[chat_id]['table']]),
-                                p
-                            )
-                        )
-                        self.state.users[chat_id] = {}
-                        button = ReplyKeyboardMarkup(
-                            [['/calculate']],
-                            resize_keyboard=True,
-                            one_time_keyboard=True,
-                            remove_keyboard=True
-                        )
-                        context.bot.send_message(
-                            chat_id=chat_id,
-                            text=(
-                                'Если хотите продолжить, Вам нужно последовательно задать следующие параметры:\n'
-                                '1. Первую карту в руке.\n2. Вторую карту в руке.\n'
-                                '3. Количество игроков.\n4. Стадию игры, где 0 - пре-флоп '
-                                '(на столе нет карт), 1 - флоп (на столе 3 карты), 2 - тёрн'
-                                ' (на столе 4 карты), 3 - ривер (на столе 5 карт).\n'
-                                '5. Поочередно указать все карты на столе, если они есть.\n'
-                                '6. Указать другие карты, которые вам известны - они будут '
-                                'убраны из генерации.'
-                            ),
-                            reply_markup=button
-                        )
+                elif self._is_used(user, incoming_message):
+                    context.bot.send_message(
+                        chat_id=chat_id, text='Эта карта уже выбрана'
+                    )
+                elif incoming_message in CARD_TEXTS:
+                    user.table += (
+                        (VALUE_R[incoming_message[:-1]], SUIT_R[incoming_message[-1]]),
+                    )
+                    if len(user.table) == user.stage + 2:
+                        self._calculate_state(context, chat_id, user)
                     else:
-                        button = ReplyKeyboardMarkup(
-                            [
-                                [v + suit for v in list('23456789')]
-                                for suit in ['\u2664', '\u2665', '\u2666', '\u2667']
-                            ] + [['>>']],
-                            resize_keyboard=True,
-                            one_time_keyboard=True,
-                            remove_keyboard=True
-                        )
+                        self.state.set(chat_id, user)
                         context.bot.send_message(
                             chat_id=chat_id,
                             text='Выберите карту',
-                            reply_markup=button
+                            reply_markup=LOW_CARDS_KEYBOARD
                         )
 
+    def _is_used(self, user, incoming_message):
+        """
+        Проверяет, выбрана ли уже карта (в руке или на столе).
+        """
+        if incoming_message[:-1] not in VALUE_R or incoming_message[-1:] not in SUIT_R:
+            return False
+        return (
+            VALUE_R[incoming_message[:-1]], SUIT_R[incoming_message[-1]]
+        ) in user.used
+
+    def _calculate_state(self, context, chat_id, user):
+        """
+        Завершает диалог: запускает расчет по заданным в нем параметрам.
+        """
+        self.state.delete(chat_id)
+        self._start_calculation(
+            context, chat_id, (user.first_card, user.second_card),
+            user.players_count, user.table
+        )
+
+    def _start_calculation(
+        self, context, chat_id, hand, players_count, table=None, dialog=True
+    ):
+        """
+        Отправляет расчет вероятности выигрыша в пул процессов и сразу
+        возвращает управление диспетчеру. Когда расчет готов, сообщение
+        'Производится расчет...' заменяется результатом.
+        :param dialog: расчет завершает диалог: он отменяется командами
+            /start и /calculate, а после результата отправляется
+            предложение продолжить.
+        """
+        table = tuple(table) if table else None
+        if table:
+            text = 'Игроков: {}. Рука: {}{}. Стол: {}.\n'.format(
+                players_count, Card(*hand[0]), Card(*hand[1]),
+                ''.join([str(Card(*i)) for i in table])
+            ) + 'P = {:.04}%'
+        else:
+            text = 'Игроков: {}. Рука: {}{}. '.format(
+                players_count, Card(*hand[0]), Card(*hand[1])
+            ) + 'P = {:.04}%'
+        key = p_win_key(hand, players_count, table)
+        p = self.cache.get(key)
+        source = 'кэш'
+        if p is None and not table:
+            # до флопа ответ берется из таблицы, без обращения к пулу
+            preflop_table = get_table()
+            entry = None
+            if preflop_table is not None:
+                entry = preflop_table.lookup(hand, players_count)
+            if entry is not None:
+                p = entry[0] * 100
+                self.cache.set(key, p)
+                source = 'таблица'
+        if p is not None:
+            context.bot.send_message(chat_id=chat_id, text=text.format(p))
+            logger.info('%s, %s (%s)', chat_id, text.format(p), source)
+            if dialog:
+                self._send_continue(context.bot, chat_id)
+            return
+
+        if len(self.flights) >= CALCULATION_QUEUE_SIZE:
+            context.bot.send_message(
+                chat_id=chat_id,
+                text='Сервер перегружен, попробуйте позже'
+            )
+            logger.warning('%s, calculation queue is full', chat_id)
+            if dialog:
+                self._send_continue(context.bot, chat_id)
+            return
+        message = context.bot.send_message(
+            chat_id=chat_id, text='Производится расчет...'
+        )
+        future = self.flights.submit(
+            key, _calculate_p_win, hand, players_count, table
+        )
+        if dialog:
+            with self._requests_lock:
+                self.requests[chat_id] = future
+        future.add_done_callback(functools.partial(
+            self._finish_calculation, context.bot, chat_id,
+            message.message_id, key, text, dialog
+        ))
+
+    def _finish_calculation(
+        self, bot, chat_id, message_id, key, text, dialog, future
+    ):
+        """
+        Публикует результат расчета (вызывается потоком пула процессов)
+        или сообщает об отмене запроса.
+        """
+        with self._requests_lock:
+            if self.requests.get(chat_id) is future:
+                del self.requests[chat_id]
+        if future.cancelled():
+            try:
+                bot.edit_message_text(
+                    'Расчет отменен', chat_id=chat_id, message_id=message_id
+                )
+            except TelegramError:
+                logger.exception('%s, failed to send the result', chat_id)
+            return
+        try:
+            p = future.result()
+        except Exception:
+            logger.exception('%s, calculation failed', chat_id)
+            text = 'Не удалось выполнить расчет, попробуйте еще раз'
+        else:
+            self.cache.set(key, p)
+            text = text.format(p)
+            logger.info('%s, %s', chat_id, text)
+        try:
+            bot.edit_message_text(
+                text, chat_id=chat_id, message_id=message_id
+            )
+            if dialog:
+                self._send_continue(bot, chat_id)
+        except TelegramError:
+            logger.exception('%s, failed to send the result', chat_id)
+
+    def _cancel_request(self, chat_id):
+        """
+        Отменяет незавершенный запрос чата: его результат больше не нужен.
+        Сам расчет продолжается, если к нему присоединены другие запросы.
+        """
+        with self._requests_lock:
+            future = self.requests.pop(chat_id, None)
+        # cancel вызывает _finish_calculation синхронно, поэтому - вне
+        # блокировки
+        if future is not None and future.cancel():
+            logger.info('%s, calculation cancelled', chat_id)
+
+    def _send_continue(self, bot, chat_id):
+        bot.send_message(
+            chat_id=chat_id,
+            text=(
+                'Если хотите продолжить, Вам нужно последовательно задать следующие параметры:\n'
+                '1. Первую карту в руке.\n2. Вторую карту в руке.\n'
+                '3. Количество игроков.\n4. Стадию игры, где 0 - пре-флоп '
+                '(на столе нет карт), 1 - флоп (на столе 3 карты), 2 - тёрн'
+                ' (на столе 4 карты), 3 - ривер (на столе 5 карт).\n'
+                '5. Поочередно указать все карты на столе, если они есть.\n'
+                '6. Указать другие карты, которые вам известны - они будут '
+                'убраны из генерации.'
+            ),
+            reply_markup=CALCULATE_KEYBOARD
+        )
+
+    def eq(self, update, context):
+        """
+        Расчет одной командой: /eq <рука> <количество игроков> [<стол>].
+        """
+        chat_id = update.message.chat_id
+        logger.info('%s, %s', chat_id, update.message.text)
+        try:
+            hand, players_count, table = parse_eq(update.message.text)
+        except ValueError as error:
+            context.bot.send_message(chat_id=chat_id, text=str(error))
+            return
+        self._start_calculation(
+            context, chat_id, hand, players_count, table, dialog=False
+        )
+
     def wake_up(self, update, context):
         chat_id = update.message.chat_id
-        print(update.message)
-        print(self.state)
-        logging.info(f'{chat_id}, {update.message.text}')
-        # удаляем состояние текущего чата, если оно есть
-        self.state.users.pop(chat_id, None)
-        self.state.users[chat_id] = {}
+        logger.info('%s, %s', chat_id, update.message.text)
+        # удаляем состояние и незавершенный запрос текущего чата, если они есть
+        self.state.delete(chat_id)
+        self._cancel_request(chat_id)
         name = update.message.chat.first_name
         last_name = update.message.chat.last_name
-        button = ReplyKeyboardMarkup(
-            [['/calculate']],
-            resize_keyboard=True,
-            one_time_keyboard=True,
-            remove_keyboard=True
-        )
-        logging.info(f'Activated. {chat_id}: {name} {last_name}')
+        logger.info('Activated. %s: %s %s', chat_id, name, last_name)
 
         context.bot.send_message(
             chat_id=chat_id,
@@ -369,33 +456,26 @@ class PokerBot(object):
                 ' (на столе 4 карты), 3 - ривер (на столе 5 карт).\n'
                 '5. Поочередно указать все карты на столе, если они есть.\n'
                 '6. Указать другие карты, которые вам известны - они будут '
-                'убраны из генерации.'
+                'убраны из генерации.\n'
+                'Можно задать все сразу одним сообщением: /eq <рука> '
+                '<количество игроков> [<карты стола>], например /eq A♤K♥ 6 Q♥7♧2♤'
             ),
-            reply_markup=button
+            reply_markup=CALCULATE_KEYBOARD
         )
 
     def init_calculation(self, update, context):
         chat_id = update.message.chat_id
-        logging.info(f'{chat_id}, {update.message.text}')
-        self.state.users[chat_id] = {}
-        self.state.users[chat_id]['step'] = 0
-        button = ReplyKeyboardMarkup(
-            [
-                [v + suit for v in list('23456789')]
-                for suit in ['\u2664', '\u2665', '\u2666', '\u2667'] #['♦️', '♥️', '♣️', '♠️'] # ['\u2664', '\u2665', '\u2666', '\u2667']
-            ] + [['>>']],
-            resize_keyboard=True,
-            one_time_keyboard=True,
-            remove_keyboard=True
-        )
+        logger.info('%s, %s', chat_id, update.message.text)
+        self._cancel_request(chat_id)
+        self.state.set(chat_id, ChatState())
         context.bot.send_message(
             chat_id=chat_id,
             text='Выберите первую карту',
-            reply_markup=button
+            reply_markup=LOW_CARDS_KEYBOARD
         )
 
 
 if __name__ == '__main__':
-    logging.config.dictConfig(LOGGING_CONFIG)
+    setup_logging()
     poker_bot = PokerBot(TELEGRAM_TOKEN)
     poker_bot.start()
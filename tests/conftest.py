@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули приложения импортируются без пакета (как при запуске из pokerapp).
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'pokerapp'))
@@ -0,0 +1,65 @@
+import random
+
+import actions
+import player_status
+from cards import Deck
+from game import Deal, Game, GameSettings
+from player import Player
+from providers import ScriptedActionProvider
+
+
+def make_players(scripts, wealth=100):
+    return [
+        Player(True, seat, wealth, f'Bot{seat}', ScriptedActionProvider(script))
+        for seat, script in enumerate(scripts)
+    ]
+
+
+def test_all_players_fold():
+    players = make_players([[actions.FOLD] * 10] * 4)
+    deal = Deal(
+        players, small_blind_rate=1, headless=True, deck=Deck(rng=random.Random(0))
+    ).play()
+    assert deal.is_over
+    assert not deal.showdown
+    # все сбросили карты, кроме большого блайнда: ему сбрасывать не дают
+    assert [player.wealth for player in players] == [99, 101, 100, 100]
+
+
+def test_scripted_folds_keep_chips():
+    steps = [
+        actions.FOLD, actions.CALL, actions.CHECK, (actions.RAISE, 30),
+        actions.ALL_IN
+    ]
+    for seed in range(100):
+        rng = random.Random(seed)
+        players = make_players(
+            [[rng.choice(steps) for _ in range(400)] for _ in range(4)]
+        )
+        Game(
+            players, GameSettings(), headless=True,
+            deck=Deck(rng=random.Random(seed))
+        ).play(50)
+        assert sum(player.wealth for player in players) == 400
+        assert all(player.status == player_status.ACTIVE for player in players)
+
+
+def test_folded_overbets_go_to_the_pot():
+    players = make_players([[]] * 4)
+    deal = Deal(
+        players, small_blind_rate=1, headless=True, deck=Deck(rng=random.Random(0))
+    )
+    deal.table = [deal._deck.pop() for _ in range(5)]
+    # первые два игрока поставили по 56 и сбросили карты, четвертый пошел
+    # ва-банк на 15
+    for player, bid, status in zip(
+        players,
+        (56, 56, 0, 15),
+        (player_status.FOLD, player_status.FOLD, player_status.FOLD,
+         player_status.ALL_IN)
+    ):
+        player.wealth_change = -bid
+        player.current_bid = bid
+        player.status = status
+    deal.define_winner()
+    assert [player.wealth for player in players] == [44, 44, 100, 212]
@@ -0,0 +1,22 @@
+import pytest
+
+import simulator
+
+STRATEGIES = ['random', 'passive', 'random']
+
+
+def test_rerun_reuses_parts(tmp_path):
+    first = simulator.simulate(60, STRATEGIES, str(tmp_path), workers=1, deals_limit=200)
+    second = simulator.simulate(60, STRATEGIES, str(tmp_path), workers=1, deals_limit=200)
+    assert simulator.summary(first) == simulator.summary(second)
+    columns = simulator.load_results(str(tmp_path))
+    assert columns['seeds'].tolist() == list(range(60))
+    assert columns['chips'].shape == (60, 200 // 50 + 1, len(STRATEGIES))
+
+
+def test_rerun_with_other_settings_fails(tmp_path):
+    simulator.simulate(50, STRATEGIES, str(tmp_path), workers=1, deals_limit=200)
+    with pytest.raises(ValueError, match='other settings'):
+        simulator.simulate(50, STRATEGIES, str(tmp_path), workers=1, deals_limit=1000)
+    with pytest.raises(ValueError, match='other settings'):
+        simulator.simulate(50, STRATEGIES, str(tmp_path), workers=1, wealth=50)
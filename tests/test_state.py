@@ -0,0 +1,42 @@
+import sqlite3
+import time
+
+from state import ChatState, SqliteStateStore
+
+
+def rows(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute('SELECT COUNT(*) FROM chat_state').fetchone()[0]
+
+
+def test_expired_rows_are_purged_in_background(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+    store = SqliteStateStore(path, ttl=0.1, purge_interval=0.05)
+    try:
+        for chat_id in range(100):
+            store.set(chat_id, ChatState(step=1))
+        assert rows(path) == 100
+        deadline = time.monotonic() + 5
+        while rows(path) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert rows(path) == 0
+        assert store.get(1) is None
+    finally:
+        store.close()
+
+
+def test_expired_rows_are_purged_on_open(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+    store = SqliteStateStore(path, batch_size=10)
+    for chat_id in range(25):
+        store.set(chat_id, ChatState(step=2))
+    store.close()
+    assert rows(path) == 25
+    time.sleep(0.2)
+    store = SqliteStateStore(path, ttl=0.1)
+    try:
+        assert rows(path) == 0
+        store.set(1, ChatState(step=3))
+        assert store.get(1) == ChatState(step=3)
+    finally:
+        store.close()